@@ -1,4 +1,5 @@
 import streamlit as st
+import streamlit.components.v1 as components
 
 # 페이지 설정 (반드시 첫 번째 Streamlit 명령어여야 함)
 st.set_page_config(
@@ -10,11 +11,51 @@ st.set_page_config(
 
 import pandas as pd
 import numpy as np
+import codecs
+import hashlib
+import json
+import os
 import re
+import socket
+import sys
+import time
+import uuid
+import argparse
+import bisect
+import itertools
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import shutil
+import tempfile
+from statistics import NormalDist
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime
 from io import StringIO
 import plotly.express as px
 import plotly.graph_objects as go
-from collections import Counter
+from scipy import sparse
+import joblib
+import sklearn
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import Ridge
+from sklearn.utils import murmurhash3_32
+from wordcloud import WordCloud
+
+# Arrow 기반 멀티스레드 CSV 파서 (미설치 시 pandas 파서로 대체)
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pacsv = None
+    pq = None
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -80,6 +121,509 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+def detect_encoding(sample):
+    """바이트 표본으로 CSV 인코딩 판별 (BOM → UTF-8 → CP949 순)"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    # 표본 끝에서 잘린 멀티바이트 문자를 허용하도록 증분 디코더 사용
+    for encoding in ('utf-8', 'cp949'):
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+def _read_encoding_sample(source, sample_size=1 << 16):
+    """경로 또는 파일 객체에서 앞부분 바이트를 읽고 위치를 되돌림"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(sample_size)
+    position = source.tell()
+    sample = source.read(sample_size)
+    source.seek(position)
+    return sample if isinstance(sample, bytes) else sample.encode('utf-8')
+
+def _arrow_encoding(encoding):
+    """Arrow ReadOptions용 인코딩 이름 (UTF-8 BOM은 Arrow가 자동 처리)"""
+    return 'utf8' if encoding in ('utf-8', 'utf-8-sig') else encoding
+
+def _fallback_encoding(encoding):
+    """자동 판별 결과가 틀렸을 때 다시 시도할 인코딩 (앞부분 표본이 ASCII뿐인 CP949 파일은 UTF-8로 판별됨)"""
+    return 'cp949' if encoding == 'utf-8' else None
+
+def _is_utf8_decode_error(error):
+    return isinstance(error, UnicodeDecodeError) or (
+        pa is not None and isinstance(error, pa.ArrowInvalid) and 'UTF8' in str(error)
+    )
+
+def _rewind(source, position):
+    if position is not None:
+        source.seek(position)
+
+def read_csv_fast(source, encoding=None, usecols=None):
+    """인코딩 자동 판별 + Arrow 멀티스레드 파싱으로 CSV 로드 (실패 시 pandas로 대체)
+
+    자동 판별한 UTF-8이 표본 뒤에서 깨지면 (Arrow가 열을 binary로 추론하거나 pandas가
+    디코딩에 실패하면) CP949로 다시 읽는다.
+    """
+    fallback = None
+    if encoding is None:
+        encoding = detect_encoding(_read_encoding_sample(source))
+        fallback = _fallback_encoding(encoding)
+    position = None if isinstance(source, (str, os.PathLike)) else source.tell()
+    if pacsv is not None:
+        try:
+            table = pacsv.read_csv(
+                source,
+                read_options=pacsv.ReadOptions(encoding=_arrow_encoding(encoding), use_threads=True),
+                convert_options=pacsv.ConvertOptions(include_columns=usecols, strings_can_be_null=True)
+            )
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, UnicodeDecodeError):
+            _rewind(source, position)
+        else:
+            binary_columns = any(pa.types.is_binary(t) or pa.types.is_large_binary(t) for t in table.schema.types)
+            if fallback is None or not binary_columns:
+                return table.to_pandas()
+            _rewind(source, position)
+            return read_csv_fast(source, fallback, usecols)
+    try:
+        return pd.read_csv(source, encoding=encoding, usecols=usecols)
+    except UnicodeDecodeError:
+        if fallback is None:
+            raise
+        _rewind(source, position)
+        return read_csv_fast(source, fallback, usecols)
+
+def iter_csv_chunks(source, usecols=None, chunksize=50000, encoding=None):
+    """CSV를 chunksize행 DataFrame 청크로 스트리밍 (Arrow 스트리밍 리더 우선, 인코딩은 스트림 디코딩)
+
+    Arrow 스트리밍 리더는 첫 블록에서 열 타입을 고정하므로, 뒤쪽 블록에서 타입이 달라져도
+    중간에 실패하지 않도록 대상 열을 모두 문자열로 읽는다. 자동 판별한 UTF-8이 스트림 중간에서
+    깨지면 처음부터 CP949로 다시 읽되, 이미 내보낸 청크는 건너뛴다.
+    """
+    fallback = None
+    if encoding is None:
+        encoding = detect_encoding(_read_encoding_sample(source))
+        fallback = _fallback_encoding(encoding)
+    position = None if isinstance(source, (str, os.PathLike)) else source.tell()
+    chunks_done = 0
+    try:
+        for chunk in _iter_csv_chunks(source, usecols, chunksize, encoding):
+            yield chunk
+            chunks_done += 1
+    except Exception as error:
+        if fallback is None or not _is_utf8_decode_error(error):
+            raise
+        _rewind(source, position)
+        # 마지막 청크만 chunksize보다 작으므로 내보낸 청크 수만큼 건너뛰면 행 위치가 정확히 이어짐
+        yield from itertools.islice(_iter_csv_chunks(source, usecols, chunksize, fallback), chunks_done, None)
+
+def _iter_csv_chunks(source, usecols, chunksize, encoding):
+    if pacsv is not None:
+        position = None if isinstance(source, (str, os.PathLike)) else source.tell()
+        try:
+            columns = usecols or read_csv_columns(source, encoding)
+            reader = pacsv.open_csv(
+                source,
+                read_options=pacsv.ReadOptions(encoding=_arrow_encoding(encoding), use_threads=True),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=usecols,
+                    column_types={column: pa.large_string() for column in columns},
+                    strings_can_be_null=True
+                )
+            )
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            # 첫 블록부터 읽을 수 없으면 pandas 청크 리더로 대체
+            _rewind(source, position)
+            reader = None
+        if reader is not None:
+            # 블록 크기와 무관하게 요청한 행 수 단위로 다시 자르기
+            pending, pending_rows = [], 0
+            for batch in reader:
+                pending.append(batch)
+                pending_rows += batch.num_rows
+                while pending_rows >= chunksize:
+                    table = pa.Table.from_batches(pending)
+                    yield table.slice(0, chunksize).to_pandas()
+                    rest = table.slice(chunksize)
+                    pending, pending_rows = rest.to_batches(), rest.num_rows
+            if pending_rows:
+                yield pa.Table.from_batches(pending).to_pandas()
+            return
+    yield from pd.read_csv(source, encoding=encoding, usecols=usecols, chunksize=chunksize)
+
+def read_csv_columns(source, encoding=None):
+    """CSV 헤더의 컬럼명만 읽기 (파일 객체는 위치를 되돌림)"""
+    fallback = None
+    if encoding is None:
+        encoding = detect_encoding(_read_encoding_sample(source))
+        fallback = _fallback_encoding(encoding)
+    position = None if isinstance(source, (str, os.PathLike)) else source.tell()
+    try:
+        columns = pd.read_csv(source, encoding=encoding, nrows=0).columns.tolist()
+    except UnicodeDecodeError:
+        if fallback is None:
+            raise
+        _rewind(source, position)
+        columns = pd.read_csv(source, encoding=fallback, nrows=0).columns.tolist()
+    _rewind(source, position)
+    return columns
+
+def csv_source_size(source):
+    """경로 또는 파일 객체의 바이트 크기"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    position = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(position)
+    return size
+
+def collect_csv_sources(uploaded_files=None, directory=None):
+    """업로드 파일과 서버 디렉터리(하위 폴더 포함)에서 (표시 이름, 원본) 목록 생성"""
+    sources = [(uploaded_file.name, uploaded_file) for uploaded_file in uploaded_files or []]
+    if directory:
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"디렉터리를 찾을 수 없습니다: {directory}")
+        paths = []
+        for root, _, file_names in os.walk(directory):
+            paths += [os.path.join(root, name) for name in file_names if name.lower().endswith('.csv')]
+        sources += [(os.path.relpath(path, directory), path) for path in sorted(paths)]
+    return sources
+
+class MetricHistogram:
+    """Prometheus 형식 누적 히스토그램"""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value, times=1):
+        self.counts[bisect.bisect_left(self.buckets, value)] += times
+        self.total += value * times
+        self.count += times
+
+    def merge(self, counts, total):
+        """같은 버킷 경계로 다른 곳(작업자 프로세스)에서 모은 개수와 합계 더하기"""
+        for index, count in enumerate(counts):
+            self.counts[index] += int(count)
+        self.total += float(total)
+        self.count += int(sum(counts))
+
+    def quantile(self, q):
+        """버킷 내 선형 보간으로 분위수 추정"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= target and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def render(self, name, labels=""):
+        lines = []
+        cumulative = 0
+        separator = "," if labels else ""
+        for bucket, bucket_count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bucket}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total:.9g}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+def get_current_rss_bytes():
+    """현재 프로세스 상주 메모리 (Linux는 /proc, 그 외는 최대 RSS로 대체)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return 0
+
+def get_child_process_memory_bytes():
+    """multiprocessing 자식 프로세스들의 전용(private) 상주 메모리 합
+
+    포크로 물려받아 부모와 공유 중인 페이지는 부모 RSS에 이미 포함되므로 자식마다
+    smaps_rollup의 Private_Clean + Private_Dirty만 더한다 (Linux 외에는 0).
+    """
+    total = 0
+    try:
+        children = multiprocessing.active_children()
+    except RuntimeError:
+        return 0
+    for child in children:
+        try:
+            with open(f'/proc/{child.pid}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                        total += int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            continue
+    return total
+
+class ScorerMetrics:
+    """채점 처리량, 지연 시간, 배치 작업 지표 (Prometheus 텍스트 형식 노출)"""
+
+    LATENCY_BUCKETS = [0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01, 0.1]
+    DURATION_BUCKETS = [0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600]
+    MEMORY_BUCKETS = [2 ** power for power in range(26, 36)]  # 64MB ~ 32GB
+    # 채점 지연은 이 횟수마다 한 번만 측정하고, 사이 호출은 직전 표본 지연으로 기록 (행별 잠금/시계 호출 방지)
+    LATENCY_SAMPLE_INTERVAL = 64
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows_scored = {}
+        self.cache_requests = {}
+        self.score_latency = MetricHistogram(self.LATENCY_BUCKETS)
+        self.batch_duration = {}
+        self.batch_peak_memory = {}
+        self.last_batch = {}
+        self.active_batch_jobs = 0
+        self.spilled_bytes = 0
+
+    def observe_score_latency(self, seconds, times=1):
+        with self.lock:
+            self.score_latency.observe(seconds, times)
+
+    def merge_score_latency(self, counts, total):
+        with self.lock:
+            self.score_latency.merge(counts, total)
+
+    def drain_score_latency(self):
+        """지연 히스토그램을 (버킷별 개수, 합계)로 꺼내고 비움 (작업자가 부모에게 넘길 때 사용)"""
+        with self.lock:
+            histogram = self.score_latency
+            self.score_latency = MetricHistogram(self.LATENCY_BUCKETS)
+        return histogram.counts, histogram.total
+
+    def add_rows_scored(self, engine, rows):
+        with self.lock:
+            self.rows_scored[engine] = self.rows_scored.get(engine, 0) + rows
+
+    def add_spilled_bytes(self, size):
+        with self.lock:
+            self.spilled_bytes += size
+
+    def record_cache(self, cache, hit):
+        key = (cache, 'hit' if hit else 'miss')
+        with self.lock:
+            self.cache_requests[key] = self.cache_requests.get(key, 0) + 1
+
+    def cache_hit_rate(self, cache):
+        hits = self.cache_requests.get((cache, 'hit'), 0)
+        misses = self.cache_requests.get((cache, 'miss'), 0)
+        return hits / (hits + misses) if hits + misses else None
+
+    @contextmanager
+    def track_batch(self, mode, sample_interval=0.2):
+        """배치 작업 동안 활성 작업 수, 소요 시간, 최대 메모리 (작업자 프로세스 포함) 기록"""
+        with self.lock:
+            self.active_batch_jobs += 1
+        started = time.perf_counter()
+        peak = [get_current_rss_bytes()]
+        stop = threading.Event()
+
+        def sample_memory():
+            while not stop.wait(sample_interval):
+                peak[0] = max(peak[0], get_current_rss_bytes() + get_child_process_memory_bytes())
+
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            peak[0] = max(peak[0], get_current_rss_bytes())
+            duration = time.perf_counter() - started
+            with self.lock:
+                self.active_batch_jobs -= 1
+                self.batch_duration.setdefault(mode, MetricHistogram(self.DURATION_BUCKETS)).observe(duration)
+                self.batch_peak_memory.setdefault(mode, MetricHistogram(self.MEMORY_BUCKETS)).observe(peak[0])
+                self.last_batch[mode] = {'duration': duration, 'peak_memory': peak[0]}
+
+    def snapshot(self):
+        """사이드바 표시용 요약 (잠금 안에서 복사)"""
+        with self.lock:
+            return {
+                'rows_scored': sum(self.rows_scored.values()),
+                'active_batch_jobs': self.active_batch_jobs,
+                'spilled_bytes': self.spilled_bytes,
+                'model_cache_hit_rate': self.cache_hit_rate('learned_model'),
+                'latency_p50': self.score_latency.quantile(0.5),
+                'latency_p95': self.score_latency.quantile(0.95),
+                'last_batch': {mode: dict(last) for mode, last in self.last_batch.items()}
+            }
+
+    def render(self):
+        """Prometheus 텍스트 노출 형식"""
+        with self.lock:
+            lines = [
+                "# HELP prompt_scorer_rows_scored_total Rows scored by engine.",
+                "# TYPE prompt_scorer_rows_scored_total counter"
+            ]
+            for engine, rows in sorted(self.rows_scored.items()):
+                lines.append(f'prompt_scorer_rows_scored_total{{engine="{engine}"}} {rows}')
+
+            lines += [
+                "# HELP prompt_scorer_cache_requests_total Cache lookups by result.",
+                "# TYPE prompt_scorer_cache_requests_total counter"
+            ]
+            for (cache, result), count in sorted(self.cache_requests.items()):
+                lines.append(f'prompt_scorer_cache_requests_total{{cache="{cache}",result="{result}"}} {count}')
+
+            lines += [
+                "# HELP prompt_scorer_score_latency_seconds calculate_total_score latency.",
+                "# TYPE prompt_scorer_score_latency_seconds histogram"
+            ]
+            lines += self.score_latency.render("prompt_scorer_score_latency_seconds")
+
+            lines += [
+                "# HELP prompt_scorer_batch_duration_seconds Batch job duration by mode.",
+                "# TYPE prompt_scorer_batch_duration_seconds histogram"
+            ]
+            for mode, histogram in sorted(self.batch_duration.items()):
+                lines += histogram.render("prompt_scorer_batch_duration_seconds", f'mode="{mode}"')
+
+            lines += [
+                "# HELP prompt_scorer_batch_peak_memory_bytes Peak resident memory per batch job.",
+                "# TYPE prompt_scorer_batch_peak_memory_bytes histogram"
+            ]
+            for mode, histogram in sorted(self.batch_peak_memory.items()):
+                lines += histogram.render("prompt_scorer_batch_peak_memory_bytes", f'mode="{mode}"')
+
+            lines += [
+                "# HELP prompt_scorer_spilled_bytes_total Intermediate batch results written to disk.",
+                "# TYPE prompt_scorer_spilled_bytes_total counter",
+                f"prompt_scorer_spilled_bytes_total {self.spilled_bytes}",
+                "# HELP prompt_scorer_active_batch_jobs Batch jobs currently running.",
+                "# TYPE prompt_scorer_active_batch_jobs gauge",
+                f"prompt_scorer_active_batch_jobs {self.active_batch_jobs}",
+                "# HELP prompt_scorer_process_resident_memory_bytes Current resident memory.",
+                "# TYPE prompt_scorer_process_resident_memory_bytes gauge",
+                f"prompt_scorer_process_resident_memory_bytes {get_current_rss_bytes()}"
+            ]
+        return "\n".join(lines) + "\n"
+
+def track_batch(metrics, mode):
+    """지표 수집기가 없으면 아무 것도 하지 않는 배치 추적 컨텍스트"""
+    return metrics.track_batch(mode) if metrics is not None else nullcontext()
+
+@st.cache_resource
+def get_metrics_registry():
+    """세션과 재실행 사이에 공유되는 프로세스 단위 지표 수집기"""
+    return ScorerMetrics()
+
+@st.cache_resource
+def start_metrics_server(host, port):
+    """/metrics HTTP 엔드포인트 시작 (포트 사용 중이면 None)"""
+    metrics = get_metrics_registry()
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def get_total_memory_bytes():
+    """물리 메모리 크기 (확인할 수 없으면 0)"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+class BatchMemoryGovernor:
+    """프로세스 내 배치 작업들이 나누어 쓰는 메모리 예산
+
+    각 작업은 청크마다 전체 예산을 실행 중인 작업 수로 나눈 몫을 다시 조회한다.
+    동시 작업이 늘어나면 청크와 병렬도가 줄고 디스크로 더 자주 내보내므로,
+    프로세스가 메모리 부족으로 종료되는 대신 처리 속도만 느려진다.
+    """
+
+    MIN_SHARE_BYTES = 64 * 2 ** 20
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+        self.active_jobs = 0
+
+    @contextmanager
+    def job(self):
+        with self.lock:
+            self.active_jobs += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.active_jobs -= 1
+
+    def share(self):
+        """작업 하나에 할당되는 현재 메모리 몫 (바이트)"""
+        with self.lock:
+            jobs = max(1, self.active_jobs)
+        return max(self.MIN_SHARE_BYTES, self.budget_bytes // jobs)
+
+@st.cache_resource
+def get_memory_governor():
+    """세션 사이에 공유되는 배치 메모리 예산 (기본값: 물리 메모리의 25%)"""
+    budget_mb = os.environ.get('PROMPT_SCORER_MEMORY_BUDGET_MB')
+    if budget_mb:
+        budget_bytes = int(float(budget_mb) * 2 ** 20)
+    else:
+        budget_bytes = get_total_memory_bytes() // 4 or 2 ** 30
+    return BatchMemoryGovernor(budget_bytes)
+
+def render_metrics_sidebar(metrics, server):
+    """사이드바 처리 지표 요약"""
+    st.header("📈 처리 지표")
+    snapshot = metrics.snapshot()
+    hit_rate = snapshot['model_cache_hit_rate']
+    st.write(f"**채점 행 수:** {snapshot['rows_scored']:,}")
+    st.write(f"**실행 중 배치 작업:** {snapshot['active_batch_jobs']}개")
+    st.write(f"**디스크로 내보낸 중간 결과:** {snapshot['spilled_bytes'] / 2 ** 20:.1f}MB")
+    st.write(f"**모델 캐시 적중률:** {'-' if hit_rate is None else f'{hit_rate * 100:.1f}%'}")
+    st.write(
+        f"**채점 지연 (p50 / p95):** "
+        f"{snapshot['latency_p50'] * 1e6:.1f}µs / {snapshot['latency_p95'] * 1e6:.1f}µs"
+    )
+    for mode, last in sorted(snapshot['last_batch'].items()):
+        st.write(f"**최근 {mode} 배치:** {last['duration']:.1f}초, 최대 메모리 {last['peak_memory'] / 2 ** 20:.0f}MB")
+    if server is not None:
+        host, port = server.server_address[:2]
+        st.caption(f"Prometheus: http://{host}:{port}/metrics")
+    with st.expander("지표 원문", expanded=False):
+        st.code(metrics.render(), language="text")
+
 class AdvancedPromptScorer:
     def __init__(self):
         self.scoring_criteria = {
@@ -90,6 +634,31 @@ class AdvancedPromptScorer:
         self.optimal_temperature = 0.4  # 온도 설정 40
         # 온도 40에 최적화된 라벨 임계값 (더 엄격한 기준)
         self.label_threshold = 75  # 온도 40에서 과적합 방지를 위한 높은 임계값
+        # 지연 시간 기록용 지표 수집기 (ScorerMetrics, 없으면 기록하지 않음)
+        self.metrics = None
+        # 마지막 지연 표본과, 그 뒤 아직 기록하지 않은 호출 수
+        self._latency_sample = None
+        self._unreported_calls = 0
+        
+        # 정확도 평가 특성별 키워드, 배점, 개선 제안
+        self.feature_keywords = {
+            'role_definition': ['당신은', '전문가', '전문적인', '숙련된', '경험이 풍부한'],
+            'step_by_step': ['단계', '순서', '절차', '1.', '2.', '3.', '첫째', '둘째'],
+            'examples_inclusion': ['예를 들어', '예시', '구체적으로', '다음과 같이', '예:'],
+            'constraint_specification': ['단,', '하지만', '제한', '조건', '규칙', '주의사항']
+        }
+        self.feature_weights = {
+            'role_definition': 25,
+            'step_by_step': 20,
+            'examples_inclusion': 15,
+            'constraint_specification': 10
+        }
+        self.feature_suggestions = {
+            'role_definition': "명확한 역할 정의 추가 필요",
+            'step_by_step': "단계별 지시사항 추가 권장",
+            'examples_inclusion': "구체적인 예시 추가 필요",
+            'constraint_specification': "제약 조건 명시 추가 권장"
+        }
         
         # 근거 기반 분석을 위한 참조 데이터
         self.evidence_base = {
@@ -128,77 +697,24 @@ class AdvancedPromptScorer:
         score = 50
         evidence_found = []
         
-        # 1. 역할 정의 검사 (25점)
-        role_keywords = ['당신은', '전문가', '전문적인', '숙련된', '경험이 풍부한']
-        if any(keyword in text for keyword in role_keywords):
-            score += 25
-            evidence_found.append({
-                'type': 'role_definition',
-                'found': True,
-                'impact': 25,
-                'evidence': self.evidence_base['role_definition']['evidence']
-            })
-        else:
-            evidence_found.append({
-                'type': 'role_definition',
-                'found': False,
-                'impact': -25,
-                'suggestion': "명확한 역할 정의 추가 필요"
-            })
-        
-        # 2. 단계별 지시 검사 (20점)
-        step_keywords = ['단계', '순서', '절차', '1.', '2.', '3.', '첫째', '둘째']
-        if any(keyword in text for keyword in step_keywords):
-            score += 20
-            evidence_found.append({
-                'type': 'step_by_step',
-                'found': True,
-                'impact': 20,
-                'evidence': self.evidence_base['step_by_step']['evidence']
-            })
-        else:
-            evidence_found.append({
-                'type': 'step_by_step',
-                'found': False,
-                'impact': -20,
-                'suggestion': "단계별 지시사항 추가 권장"
-            })
-        
-        # 3. 예시 포함 검사 (15점)
-        example_keywords = ['예를 들어', '예시', '구체적으로', '다음과 같이', '예:']
-        if any(keyword in text for keyword in example_keywords):
-            score += 15
-            evidence_found.append({
-                'type': 'examples_inclusion',
-                'found': True,
-                'impact': 15,
-                'evidence': self.evidence_base['examples_inclusion']['evidence']
-            })
-        else:
-            evidence_found.append({
-                'type': 'examples_inclusion',
-                'found': False,
-                'impact': -15,
-                'suggestion': "구체적인 예시 추가 필요"
-            })
-        
-        # 4. 제약 조건 검사 (10점)
-        constraint_keywords = ['단,', '하지만', '제한', '조건', '규칙', '주의사항']
-        if any(keyword in text for keyword in constraint_keywords):
-            score += 10
-            evidence_found.append({
-                'type': 'constraint_specification',
-                'found': True,
-                'impact': 10,
-                'evidence': self.evidence_base['constraint_specification']['evidence']
-            })
-        else:
-            evidence_found.append({
-                'type': 'constraint_specification',
-                'found': False,
-                'impact': -10,
-                'suggestion': "제약 조건 명시 추가 권장"
-            })
+        # 역할 정의(25점), 단계별 지시(20점), 예시 포함(15점), 제약 조건(10점) 순서로 검사
+        for feature_type, keywords in self.feature_keywords.items():
+            impact = self.feature_weights[feature_type]
+            if any(keyword in text for keyword in keywords):
+                score += impact
+                evidence_found.append({
+                    'type': feature_type,
+                    'found': True,
+                    'impact': impact,
+                    'evidence': self.evidence_base[feature_type]['evidence']
+                })
+            else:
+                evidence_found.append({
+                    'type': feature_type,
+                    'found': False,
+                    'impact': -impact,
+                    'suggestion': self.feature_suggestions[feature_type]
+                })
         
         return max(0, min(100, score)), evidence_found
     
@@ -220,6 +736,52 @@ class AdvancedPromptScorer:
         else:
             return 50
     
+    def length_score_table(self):
+        """길이별 길이 점수표 (인덱스 = 글자 수, 마지막 칸 = 최대 길이 초과)"""
+        return [self.calculate_length_score("x" * n) for n in range(self.max_length + 2)]
+    
+    @classmethod
+    def from_rule_config(cls, config):
+        """rule_config() 형식의 설정으로 채점기 생성 (기존 특성 유형만 허용)"""
+        scorer = cls()
+        unknown = set(config.get('feature_keywords', {})) - set(scorer.feature_keywords)
+        if unknown:
+            raise ValueError(f"알 수 없는 특성 유형: {', '.join(sorted(unknown))}")
+        for key in ('feature_keywords', 'feature_weights', 'scoring_criteria'):
+            if key in config:
+                getattr(scorer, key).update(config[key])
+        for key in ('max_length', 'label_threshold'):
+            if key in config:
+                setattr(scorer, key, config[key])
+        return scorer
+    
+    def rule_config(self):
+        """채점 결과에 영향을 주는 규칙 설정"""
+        return {
+            'feature_keywords': self.feature_keywords,
+            'feature_weights': self.feature_weights,
+            'scoring_criteria': self.scoring_criteria,
+            'max_length': self.max_length,
+            'label_threshold': self.label_threshold
+        }
+    
+    def config_fingerprint(self):
+        """규칙 설정 해시 (설정이 같으면 어느 장비에서나 동일)"""
+        payload = json.dumps(self.rule_config(), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    
+    def extract_feature_flags(self, texts):
+        """텍스트 시리즈 전체에 대한 특성 보유 여부를 벡터 연산으로 계산"""
+        texts = pd.Series(texts, dtype=object)
+
+        flags = {}
+        for feature_type, keywords in self.feature_keywords.items():
+            pattern = "|".join(re.escape(keyword) for keyword in keywords)
+            matched = texts.str.contains(pattern, regex=True, na=False)
+            flags[feature_type] = matched.to_numpy(dtype=bool)
+
+        return pd.DataFrame(flags, index=texts.index)
+
     def generate_evidence_based_analysis(self, text, accuracy_score, evidence_found):
         """근거 기반 분석 생성"""
         analysis = {
@@ -348,6 +910,14 @@ class AdvancedPromptScorer:
     
     def calculate_total_score(self, text):
         """총 점수 계산 (근거 포함)"""
+        sample_latency = False
+        if self.metrics is not None:
+            if self._latency_sample is not None and self._unreported_calls < ScorerMetrics.LATENCY_SAMPLE_INTERVAL - 1:
+                self._unreported_calls += 1
+            else:
+                self.flush_score_latency()
+                sample_latency = True
+        started = time.perf_counter() if sample_latency else 0.0
         accuracy_score, evidence_found = self.calculate_accuracy_score(text)
         length_score = self.calculate_length_score(text)
         
@@ -358,7 +928,7 @@ class AdvancedPromptScorer:
         
         analysis = self.generate_evidence_based_analysis(text, accuracy_score, evidence_found)
         
-        return {
+        result = {
             'total_score': round(total_score, 2),
             'accuracy_score': accuracy_score,
             'length_score': length_score,
@@ -366,6 +936,2034 @@ class AdvancedPromptScorer:
             'evidence_analysis': analysis,
             'temperature_setting': self.optimal_temperature
         }
+        if sample_latency:
+            self._latency_sample = time.perf_counter() - started
+            self.metrics.observe_score_latency(self._latency_sample)
+        return result
+
+    def flush_score_latency(self):
+        """표본 사이에 기록하지 않은 호출을 직전 표본 지연으로 기록 (기록 횟수 = 호출 수)"""
+        if self._unreported_calls and self.metrics is not None:
+            self.metrics.observe_score_latency(self._latency_sample, self._unreported_calls)
+        self._unreported_calls = 0
+
+def _common_prefix_length(a, b):
+    """공통 접두사 길이 (슬라이스 비교 이진 탐색)"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def _common_suffix_length(a, b, limit):
+    """공통 접미사 길이 (limit 이하)"""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def _count_occurrences(text, keyword, first_start, last_start):
+    """시작 위치가 [first_start, last_start]인 키워드 출현 횟수 (겹침 포함)"""
+    count = 0
+    end = last_start + len(keyword)
+    position = text.find(keyword, max(0, first_start), end)
+    while position != -1:
+        count += 1
+        position = text.find(keyword, position + 1, end)
+    return count
+
+class IncrementalPromptMatcher:
+    """편집된 구간 주변만 다시 검사하는 증분 키워드 매처 (실시간 점수용)"""
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+        self.keywords = [
+            (feature_type, keyword)
+            for feature_type, keywords in scorer.feature_keywords.items()
+            for keyword in keywords
+        ]
+        self.counts = [0] * len(self.keywords)
+        self.text = ""
+
+    def update(self, new_text):
+        """이전 텍스트와의 차이 구간에 걸친 키워드 출현만 다시 세어 갱신"""
+        new_text = new_text if isinstance(new_text, str) else ""
+        old_text = self.text
+        if new_text == old_text:
+            return self.snapshot()
+
+        prefix = _common_prefix_length(old_text, new_text)
+        suffix = _common_suffix_length(old_text, new_text, min(len(old_text), len(new_text)) - prefix)
+        old_end = len(old_text) - suffix
+        new_end = len(new_text) - suffix
+
+        for index, (_, keyword) in enumerate(self.keywords):
+            # 편집 구간 [prefix, end)와 겹치는 출현: 시작 위치가 prefix - len + 1 ~ end - 1
+            first_start = prefix - len(keyword) + 1
+            self.counts[index] += (
+                _count_occurrences(new_text, keyword, first_start, new_end - 1)
+                - _count_occurrences(old_text, keyword, first_start, old_end - 1)
+            )
+
+        self.text = new_text
+        return self.snapshot()
+
+    def snapshot(self):
+        """calculate_total_score와 동일한 점수 요약 (근거 분석 제외)"""
+        present = {feature_type: False for feature_type in self.scorer.feature_keywords}
+        for (feature_type, _), count in zip(self.keywords, self.counts):
+            if count > 0:
+                present[feature_type] = True
+
+        if self.text.strip():
+            accuracy_score = 50 + sum(self.scorer.feature_weights[f] for f, found in present.items() if found)
+            accuracy_score = max(0, min(100, accuracy_score))
+        else:
+            accuracy_score = 0
+        length_score = self.scorer.calculate_length_score(self.text)
+        total_score = (
+            accuracy_score * self.scorer.scoring_criteria['accuracy'] +
+            length_score * self.scorer.scoring_criteria['length']
+        )
+        return {
+            'total_score': round(total_score, 2),
+            'accuracy_score': accuracy_score,
+            'length_score': length_score,
+            'label': 1 if total_score >= self.scorer.label_threshold else 0,
+            'missing_features': [f for f, found in present.items() if not found],
+            'length': len(self.text)
+        }
+
+def render_live_score_widget(scorer, textarea_label, height=120):
+    """입력 중 실시간 점수 표시 (브라우저에서 디바운스 + 증분 매칭, 규칙은 채점기에서 생성)"""
+    config = {
+        'label': textarea_label,
+        'keywords': [[f, k] for f, keywords in scorer.feature_keywords.items() for k in keywords],
+        'weights': scorer.feature_weights,
+        'criteria': scorer.scoring_criteria,
+        'threshold': scorer.label_threshold,
+        # 길이별 점수표 (calculate_length_score 결과를 그대로 사용)
+        'lengthScores': scorer.length_score_table()
+    }
+    components.html("""
+<div id="live" style="font-family:sans-serif;color:#fff;background:#2a2a3e;border-left:4px solid #17a2b8;
+     border-radius:8px;padding:0.6rem 1rem;font-size:0.9rem">
+  <div id="scores">⌨️ 입력을 시작하면 실시간 점수가 표시됩니다.</div>
+  <div id="missing" style="margin-top:0.3rem;color:#ffc107"></div>
+</div>
+<script>
+const config = __CONFIG__;
+const counts = new Array(config.keywords.length).fill(0);
+let previous = "";
+let timer = null;
+let attached = null;
+
+function countOccurrences(text, keyword, firstStart, lastStart) {
+  let count = 0;
+  let position = text.indexOf(keyword, Math.max(0, firstStart));
+  while (position !== -1 && position <= lastStart) {
+    count += 1;
+    position = text.indexOf(keyword, position + 1);
+  }
+  return count;
+}
+
+function update(next) {
+  const limit = Math.min(previous.length, next.length);
+  let prefix = 0;
+  while (prefix < limit && previous.charCodeAt(prefix) === next.charCodeAt(prefix)) prefix++;
+  let suffix = 0;
+  while (suffix < limit - prefix &&
+         previous.charCodeAt(previous.length - 1 - suffix) === next.charCodeAt(next.length - 1 - suffix)) suffix++;
+  const oldEnd = previous.length - suffix;
+  const newEnd = next.length - suffix;
+  config.keywords.forEach(([feature, keyword], index) => {
+    const firstStart = prefix - keyword.length + 1;
+    counts[index] += countOccurrences(next, keyword, firstStart, newEnd - 1)
+                   - countOccurrences(previous, keyword, firstStart, oldEnd - 1);
+  });
+  previous = next;
+}
+
+function render() {
+  const started = performance.now();
+  update(attached.value);
+  const present = {};
+  Object.keys(config.weights).forEach((feature) => { present[feature] = false; });
+  config.keywords.forEach(([feature], index) => { if (counts[index] > 0) present[feature] = true; });
+  let accuracy = 0;
+  if (previous.trim().length > 0) {
+    accuracy = 50;
+    Object.keys(present).forEach((feature) => { if (present[feature]) accuracy += config.weights[feature]; });
+    accuracy = Math.max(0, Math.min(100, accuracy));
+  }
+  const length = previous.length;
+  const lengthScore = config.lengthScores[Math.min(length, config.lengthScores.length - 1)];
+  const total = accuracy * config.criteria.accuracy + lengthScore * config.criteria.length;
+  const label = total >= config.threshold ? "고품질" : "저품질";
+  const elapsed = (performance.now() - started).toFixed(3);
+  document.getElementById("scores").textContent =
+    `총점 ${total.toFixed(1)}점 · 정확도 ${accuracy}점 · 길이 ${lengthScore}점 (${length}자) · ${label} · ${elapsed}ms`;
+  const missing = Object.keys(present).filter((feature) => !present[feature]);
+  document.getElementById("missing").textContent = missing.length ? `누락 특성: ${missing.join(", ")}` : "✅ 모든 특성 포함";
+}
+
+function attach() {
+  let textarea = null;
+  try {
+    textarea = window.parent.document.querySelector(`textarea[aria-label="${config.label}"]`);
+  } catch (error) {
+    return;
+  }
+  if (!textarea || textarea === attached) return;
+  attached = textarea;
+  attached.addEventListener("input", () => {
+    clearTimeout(timer);
+    timer = setTimeout(render, 80);
+  });
+  render();
+}
+
+attach();
+setInterval(attach, 500);
+</script>
+""".replace("__CONFIG__", json.dumps(config, ensure_ascii=False)), height=height)
+
+def compute_feature_pattern_stats(feature_flags, labels):
+    """전체 코퍼스 대상 특성 빈도, 동시 출현, 라벨별 분포 통계 (벡터 연산)"""
+    labels = pd.Series(np.asarray(labels), index=feature_flags.index, name='label')
+    flags = feature_flags.astype(np.int64)
+    feature_names = list(feature_flags.columns)
+
+    # 라벨별 특성 보유 개수와 비율 (groupby 한 번으로 계산)
+    grouped = flags.groupby(labels)
+    counts_by_label = grouped.sum()
+    rates_by_label = grouped.mean()
+    label_sizes = labels.value_counts().sort_index()
+
+    frequency = pd.DataFrame({
+        'count': flags.sum(),
+        'rate': flags.mean() if len(flags) else 0.0
+    })
+    for label_value in counts_by_label.index:
+        frequency[f'count_label_{label_value}'] = counts_by_label.loc[label_value]
+        frequency[f'rate_label_{label_value}'] = rates_by_label.loc[label_value]
+
+    # 특성 간 동시 출현 행렬 (X^T X)
+    matrix = flags.to_numpy()
+    cooccurrence = pd.DataFrame(matrix.T @ matrix, index=feature_names, columns=feature_names)
+
+    # 특성 조합(비트마스크)별 라벨 분포
+    bit_weights = 1 << np.arange(len(feature_names), dtype=np.int64)
+    combination_codes = matrix @ bit_weights
+    label_values, label_codes = np.unique(labels.to_numpy(), return_inverse=True)
+    n_combinations = 1 << len(feature_names)
+    combination_counts = np.bincount(
+        combination_codes * len(label_values) + label_codes,
+        minlength=n_combinations * len(label_values)
+    ).reshape(n_combinations, len(label_values))
+    combinations = pd.DataFrame(
+        combination_counts,
+        index=[
+            " + ".join(name for bit, name in enumerate(feature_names) if code >> bit & 1) or "(없음)"
+            for code in range(n_combinations)
+        ],
+        columns=[f'label_{label_value}' for label_value in label_values]
+    )
+    combinations['total'] = combinations.sum(axis=1)
+    combinations = combinations[combinations['total'] > 0].sort_values('total', ascending=False)
+
+    return {
+        'total_rows': len(flags),
+        'label_sizes': label_sizes,
+        'frequency': frequency,
+        'cooccurrence': cooccurrence,
+        'combinations': combinations
+    }
+
+def get_feature_gap(pattern_stats, feature_type):
+    """저품질(라벨=0) 프롬프트 중 해당 특성이 누락된 비율 (특성 분석을 생략했으면 None)"""
+    if pattern_stats is None:
+        return None
+    frequency = pattern_stats['frequency']
+    if feature_type not in frequency.index or 'rate_label_0' not in frequency.columns:
+        return None
+    return 1.0 - float(frequency.loc[feature_type, 'rate_label_0'])
+
+def aggregate_score_histogram(scores, labels, bins=50):
+    """점수 분포를 라벨별 히스토그램으로 사전 집계 (행 수와 무관한 크기)"""
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels)
+    edges = np.linspace(0, 100, bins + 1)
+
+    histogram = pd.DataFrame({
+        'bin_start': edges[:-1],
+        'bin_end': edges[1:],
+        'bin_center': (edges[:-1] + edges[1:]) / 2
+    })
+    for label_value in (0, 1):
+        counts, _ = np.histogram(scores[labels == label_value], bins=edges)
+        histogram[f'count_label_{label_value}'] = counts
+    return histogram
+
+def aggregate_length_score_bins(lengths, scores, length_bins=30, score_bins=20, max_length=3000):
+    """길이 대비 점수 2차원 구간 집계 (max_length 초과 행은 별도 초과 구간, 길이 점수 0)"""
+    lengths = np.maximum(np.asarray(lengths, dtype=np.float64), 0)
+    scores = np.asarray(scores, dtype=np.float64)
+    overflow = lengths > max_length
+    counts, length_edges, score_edges = np.histogram2d(
+        lengths[~overflow], scores[~overflow],
+        bins=[length_bins, score_bins],
+        range=[[0, max_length], [0, 100]]
+    )
+    overflow_counts, _ = np.histogram(scores[overflow], bins=score_edges)
+    length_labels = [f"{int(low)}–{int(high)}" for low, high in zip(length_edges[:-1], length_edges[1:])]
+    return {
+        'counts': np.column_stack([counts.T, overflow_counts]),  # 행: 점수 구간, 열: 길이 구간 + 초과 구간
+        'length_labels': length_labels + [f">{max_length}"],
+        'score_centers': (score_edges[:-1] + score_edges[1:]) / 2,
+        'overflow_rows': int(overflow.sum())
+    }
+
+def render_aggregated_charts(result_df, text_lengths, pattern_stats, label_threshold, max_length=3000):
+    """사전 집계된 데이터로 점수 분포, 길이 대비 점수, 특성 분포 차트 출력 (pattern_stats가 None이면 특성 차트 생략)"""
+    st.subheader("📈 점수 분포 차트")
+
+    histogram = aggregate_score_histogram(result_df['total_score'], result_df['label'])
+    length_bins = aggregate_length_score_bins(text_lengths, result_df['total_score'], max_length=max_length)
+
+    chart_col1, chart_col2 = st.columns(2)
+    with chart_col1:
+        fig = go.Figure()
+        fig.add_trace(go.Bar(
+            x=histogram['bin_center'], y=histogram['count_label_0'],
+            name='저품질 (라벨=0)', marker_color='#fd7e14'
+        ))
+        fig.add_trace(go.Bar(
+            x=histogram['bin_center'], y=histogram['count_label_1'],
+            name='고품질 (라벨=1)', marker_color='#28a745'
+        ))
+        fig.add_vline(x=label_threshold, line_dash='dash', annotation_text=f"임계값 {label_threshold}점")
+        fig.update_layout(
+            title="총점 분포", barmode='stack', bargap=0,
+            xaxis_title="총점", yaxis_title="프롬프트 수"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with chart_col2:
+        fig = go.Figure(go.Heatmap(
+            x=length_bins['length_labels'],
+            y=length_bins['score_centers'],
+            z=length_bins['counts'],
+            colorscale='Viridis',
+            colorbar=dict(title="개수")
+        ))
+        fig.update_layout(title="길이 대비 점수", xaxis_title="프롬프트 길이 (자)", yaxis_title="총점")
+        st.plotly_chart(fig, use_container_width=True)
+        if length_bins['overflow_rows']:
+            st.caption(
+                f"⚠️ {max_length:,}자 초과 프롬프트 {length_bins['overflow_rows']:,}개는 "
+                f"'>{max_length}' 구간에 따로 표시됩니다 (길이 점수 0점)."
+            )
+
+    if pattern_stats is None:
+        return
+    breakdown = pattern_stats['frequency'].reset_index(names='feature').drop(columns=['count', 'rate'])
+    rate_columns = [col for col in ('rate_label_0', 'rate_label_1') if col in breakdown.columns]
+    breakdown = breakdown.melt(id_vars='feature', value_vars=rate_columns, var_name='label', value_name='rate')
+    breakdown['label'] = breakdown['label'].map({'rate_label_0': '저품질 (라벨=0)', 'rate_label_1': '고품질 (라벨=1)'})
+    breakdown['rate'] = breakdown['rate'] * 100
+    fig = px.bar(
+        breakdown, x='feature', y='rate', color='label', barmode='group',
+        labels={'feature': '특성', 'rate': '보유 비율 (%)', 'label': '라벨'},
+        title="라벨별 특성 보유 비율"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+class CorpusTermAnalyzer:
+    """해싱 벡터화 기반 라벨별 어휘 빈도 누적기 (어휘 크기와 무관한 고정 메모리)
+
+    해시 버킷은 여러 어휘가 공유할 수 있으므로 버킷마다 어휘를 최대 MAX_TERMS_PER_BUCKET개까지
+    기록하고, 충돌한 버킷은 "a / b" 형태로 표시한다 (기록 한도를 넘으면 "/ …" 추가).
+    """
+
+    MAX_TERMS_PER_BUCKET = 3
+
+    def __init__(self, n_features=2 ** 18):
+        self.n_features = n_features
+        self.tokenize = re.compile(r"(?u)\b\w\w+\b").findall
+        # 토큰 목록을 그대로 해싱 (청크마다 정규식 토큰화는 한 번만 수행)
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            alternate_sign=False,
+            norm=None,
+            analyzer=list
+        )
+        self.term_counts = np.zeros((2, n_features), dtype=np.float64)
+        self.document_counts = np.zeros(2, dtype=np.int64)
+        # 해시 버킷별 어휘 목록과 기록 한도를 넘은 버킷
+        self.bucket_terms = {}
+        self.overflow_buckets = set()
+
+    def partial_fit(self, texts, labels):
+        """텍스트 청크와 라벨을 받아 라벨별 어휘 빈도를 누적"""
+        token_lists = [self.tokenize(text.lower()) if isinstance(text, str) else [] for text in texts]
+        labels = np.asarray(labels, dtype=np.int64)
+        if not token_lists:
+            return self
+
+        term_matrix = self.vectorizer.transform(token_lists)
+        label_indicator = sparse.csr_matrix(
+            (np.ones(len(labels)), (labels, np.arange(len(labels)))),
+            shape=(2, len(labels))
+        )
+        self.term_counts += (label_indicator @ term_matrix).toarray()
+        self.document_counts += np.bincount(labels, minlength=2)
+        self._register_terms(sorted(set().union(*token_lists)))
+        return self
+
+    def _register_terms(self, tokens):
+        """청크의 고유 어휘를 버킷별 어휘 목록에 등록 (충돌 어휘 포함)"""
+        if not tokens:
+            return
+        buckets = self.vectorizer.transform([[token] for token in tokens]).indices
+        for token, bucket in zip(tokens, buckets.tolist()):
+            terms = self.bucket_terms.setdefault(bucket, [])
+            if token in terms:
+                continue
+            if len(terms) < self.MAX_TERMS_PER_BUCKET:
+                terms.append(token)
+            else:
+                self.overflow_buckets.add(bucket)
+
+    def bucket_label(self, bucket):
+        """버킷 표시 이름 (충돌 어휘는 " / "로 구분)"""
+        label = " / ".join(self.bucket_terms[bucket])
+        return label + " / …" if bucket in self.overflow_buckets else label
+
+    def is_collided(self, bucket):
+        return len(self.bucket_terms[bucket]) > 1 or bucket in self.overflow_buckets
+
+    def top_terms(self, label_value, top_n=100):
+        """라벨별 상위 빈도 어휘 (워드클라우드용)"""
+        counts = self.term_counts[label_value]
+        top_buckets = np.argsort(counts)[::-1][:top_n]
+        return {
+            self.bucket_label(int(bucket)): float(counts[bucket])
+            for bucket in top_buckets
+            if counts[bucket] > 0 and int(bucket) in self.bucket_terms
+        }
+
+    def discriminative_terms(self, top_n=20, min_count=5, smoothing=1.0):
+        """고품질/저품질을 구분하는 어휘 (평활화된 로그 오즈비 기준, 해시 충돌 여부 표시)"""
+        totals = self.term_counts.sum(axis=1, keepdims=True)
+        rates = (self.term_counts + smoothing) / (totals + smoothing * self.n_features)
+        log_odds = np.log(rates[1]) - np.log(rates[0])
+
+        known_buckets = np.fromiter(self.bucket_terms.keys(), dtype=np.int64, count=len(self.bucket_terms))
+        candidates = known_buckets[self.term_counts[:, known_buckets].sum(axis=0) >= min_count]
+
+        def build_table(buckets):
+            return pd.DataFrame({
+                'term': [self.bucket_label(int(bucket)) for bucket in buckets],
+                'count_label_1': self.term_counts[1, buckets].astype(np.int64),
+                'count_label_0': self.term_counts[0, buckets].astype(np.int64),
+                'log_odds': np.round(log_odds[buckets], 3),
+                'hash_collision': [self.is_collided(int(bucket)) for bucket in buckets]
+            })
+
+        order = candidates[np.argsort(log_odds[candidates])]
+        return {
+            'high_quality': build_table(order[::-1][:top_n]),
+            'low_quality': build_table(order[:top_n])
+        }
+
+class LearnedPromptScorer:
+    """규칙 기반 점수로 학습한 희소 선형 모델 채점기 (배치 예측 전용)"""
+
+    FORMAT_VERSION = 1
+    MAX_CACHED_TOKENS = 1000000
+
+    def __init__(self, scorer, cache_dir=None, n_features=2 ** 18):
+        self.scorer = scorer
+        self.cache_dir = cache_dir or os.environ.get(
+            'PROMPT_SCORER_CACHE_DIR',
+            os.path.join(os.path.expanduser('~'), '.cache', 'advanced_prompt_scorer')
+        )
+        self.n_features = n_features
+        # 공백 단위 어절 토큰 (문자 n-gram 대비 약 10배 빠르고 '1.', '단,' 같은 키워드 보존)
+        # HashingVectorizer(token_pattern=r"(?u)\S+", binary=True)와 같은 버킷을 쓰되 토큰별 해시를 캐시
+        self._bucket_cache = {}
+        # calculate_length_score 구간 경계 (<50, 50-99, 100-1500, 1501-2500, 2501-max, >max)
+        self.length_edges = np.array([50, 100, 1501, 2501, scorer.max_length + 1])
+        self.model = None
+        self.training_info = {}
+
+    def config_fingerprint(self):
+        """규칙 설정과 모델 형식이 바뀌면 달라지는 캐시 키"""
+        config = {
+            'format_version': self.FORMAT_VERSION,
+            'sklearn_version': sklearn.__version__,
+            'n_features': self.n_features,
+            'rules': self.scorer.rule_config()
+        }
+        payload = json.dumps(config, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def cache_path(self):
+        """버전별 모델 캐시 파일 경로"""
+        return os.path.join(
+            self.cache_dir,
+            f"learned_scorer_v{self.FORMAT_VERSION}_{self.config_fingerprint()}.joblib"
+        )
+
+    def transform(self, texts):
+        """공백 단위 어절 토큰 해싱 특성 + 길이 구간 특성으로 희소 행렬 생성"""
+        texts = [text if isinstance(text, str) else "" for text in texts]
+        token_matrix = self._hash_tokens(texts)
+
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        buckets = np.searchsorted(self.length_edges, lengths, side='right')
+        # 공백뿐인 텍스트는 정확도 0점 처리되므로 별도 구간으로 분리
+        blank = np.fromiter((not text.strip() for text in texts), dtype=bool, count=len(texts))
+        buckets[blank] = len(self.length_edges) + 1
+        length_matrix = sparse.csr_matrix(
+            (np.ones(len(texts)), (np.arange(len(texts)), buckets)),
+            shape=(len(texts), len(self.length_edges) + 2)
+        )
+        return sparse.hstack([token_matrix, length_matrix], format='csr')
+
+    def _hash_tokens(self, texts):
+        """어절 토큰을 해시 버킷 이진 희소 행렬로 변환 (sklearn FeatureHasher와 동일한 인덱스)"""
+        cache = self._bucket_cache
+        if len(cache) > self.MAX_CACHED_TOKENS:
+            cache.clear()
+        n_features = self.n_features
+        indices = []
+        indptr = np.zeros(len(texts) + 1, dtype=np.int64)
+        for row, text in enumerate(texts):
+            for token in set(text.lower().split()):
+                bucket = cache.get(token)
+                if bucket is None:
+                    # murmurhash3_32 부호 있는 값의 절댓값 (INT_MIN도 Python 정수라 동일 결과)
+                    bucket = cache[token] = abs(murmurhash3_32(token, seed=0)) % n_features
+                indices.append(bucket)
+            indptr[row + 1] = len(indices)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices)), np.array(indices, dtype=np.int64), indptr),
+            shape=(len(texts), n_features)
+        )
+        # 서로 다른 토큰이 같은 버킷에 충돌해도 binary=True처럼 1로 유지
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0
+        return matrix
+
+    def fit(self, texts):
+        """calculate_total_score 결과를 정답으로 모델 학습"""
+        texts = list(texts)
+        scores = np.array([self.scorer.calculate_total_score(text)['total_score'] for text in texts])
+        self.model = Ridge(alpha=1.0)
+        self.model.fit(self.transform(texts), scores)
+        self.training_info = {
+            'trained_rows': len(texts),
+            'trained_at': datetime.now().isoformat(timespec='seconds')
+        }
+        return self
+
+    def save(self):
+        """모델을 버전 캐시에 저장"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.cache_path()
+        joblib.dump({
+            'format_version': self.FORMAT_VERSION,
+            'fingerprint': self.config_fingerprint(),
+            'model': self.model,
+            'training_info': self.training_info
+        }, path)
+        return path
+
+    def load(self):
+        """현재 규칙 설정과 일치하는 캐시 모델 로드 (없거나 불일치 시 False)"""
+        path = self.cache_path()
+        if not os.path.exists(path):
+            return False
+        try:
+            payload = joblib.load(path)
+        except Exception:
+            return False
+        if payload.get('format_version') != self.FORMAT_VERSION or payload.get('fingerprint') != self.config_fingerprint():
+            return False
+        self.model = payload['model']
+        self.training_info = payload.get('training_info', {})
+        return True
+
+    def load_or_train(self, texts, retrain=False, max_training_rows=20000, random_state=42):
+        """캐시 모델을 사용하고, 없으면 표본으로 학습 후 저장"""
+        cache_hit = not retrain and self.load()
+        if self.scorer.metrics is not None:
+            self.scorer.metrics.record_cache('learned_model', cache_hit)
+        if cache_hit:
+            return False
+        texts = pd.Series(texts, dtype=object) if not isinstance(texts, pd.Series) else texts
+        if len(texts) > max_training_rows:
+            rng = np.random.default_rng(random_state)
+            texts = texts.iloc[rng.choice(len(texts), size=max_training_rows, replace=False)]
+        self.fit(texts.tolist())
+        self.save()
+        return True
+
+    def predict(self, texts, batch_size=20000):
+        """배치 단위 희소 예측으로 (점수, 라벨) 배열 반환"""
+        if self.model is None:
+            raise ValueError("학습된 모델이 없습니다. load_or_train()을 먼저 호출하세요.")
+        texts = list(texts)
+        scores = np.empty(len(texts), dtype=np.float64)
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            scores[start:start + len(batch)] = self.model.predict(self.transform(batch))
+        scores = np.round(np.clip(scores, 0, 100), 2)
+        labels = (scores >= self.scorer.label_threshold).astype(np.int64)
+        return scores, labels
+
+def compare_scoring_engines(scorer, learned_scorer, texts, sample_size=2000, random_state=0):
+    """규칙 엔진과 모델 엔진의 표본 비교 (불일치 행과 처리량)"""
+    texts = pd.Series(texts, dtype=object) if not isinstance(texts, pd.Series) else texts
+    rng = np.random.default_rng(random_state)
+    sample_index = np.sort(rng.choice(len(texts), size=min(sample_size, len(texts)), replace=False))
+    sample_texts = texts.iloc[sample_index].tolist()
+
+    start = time.perf_counter()
+    rule_results = [scorer.calculate_total_score(text) for text in sample_texts]
+    rule_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model_scores, model_labels = learned_scorer.predict(sample_texts)
+    model_seconds = time.perf_counter() - start
+
+    comparison = pd.DataFrame({
+        'row': sample_index,
+        'text': [text[:100] for text in sample_texts],
+        'rule_score': [r['total_score'] for r in rule_results],
+        'model_score': model_scores,
+        'rule_label': [r['label'] for r in rule_results],
+        'model_label': model_labels
+    })
+    comparison['score_delta'] = (comparison['model_score'] - comparison['rule_score']).round(2)
+    disagreements = comparison[comparison['rule_label'] != comparison['model_label']]
+
+    benchmark = pd.DataFrame([
+        {'engine': '규칙 기반', 'rows': len(sample_texts), 'seconds': rule_seconds},
+        {'engine': '학습 모델', 'rows': len(sample_texts), 'seconds': model_seconds}
+    ])
+    benchmark['rows_per_sec'] = (benchmark['rows'] / benchmark['seconds'].clip(lower=1e-9)).round(0)
+
+    return {
+        'sample_size': len(sample_texts),
+        'label_agreement': float((comparison['rule_label'] == comparison['model_label']).mean()) if len(comparison) else 1.0,
+        'score_mae': float(comparison['score_delta'].abs().mean()) if len(comparison) else 0.0,
+        'disagreements': disagreements,
+        'benchmark': benchmark
+    }
+
+def compare_rule_configs(texts, scorer_a, scorer_b, chunksize=100000):
+    """두 규칙 설정을 한 번의 텍스트 순회로 동시에 채점 (키워드 검사와 길이 계산 공유)"""
+    scorers = (scorer_a, scorer_b)
+    # 두 설정의 키워드 합집합 (공통 키워드는 한 번만 검사)
+    keywords = sorted({
+        keyword
+        for scorer in scorers
+        for feature_keywords in scorer.feature_keywords.values()
+        for keyword in feature_keywords
+    })
+    keyword_index = {keyword: index for index, keyword in enumerate(keywords)}
+    length_tables = [np.asarray(scorer.length_score_table(), dtype=np.float64) for scorer in scorers]
+
+    texts = pd.Series(texts, dtype=object).reset_index(drop=True)
+    frames = []
+    for start in range(0, len(texts), chunksize):
+        chunk = texts.iloc[start:start + chunksize].fillna("")
+        lengths = chunk.str.len().to_numpy()
+        blank = (chunk.str.strip() == "").to_numpy()
+        presence = np.column_stack([
+            chunk.str.contains(keyword, regex=False).to_numpy(dtype=bool)
+            for keyword in keywords
+        ]) if keywords else np.zeros((len(chunk), 0), dtype=bool)
+
+        frame = {'row': np.arange(start, start + len(chunk))}
+        for suffix, scorer, length_table in zip(('a', 'b'), scorers, length_tables):
+            accuracy = np.full(len(chunk), 50.0)
+            for feature_type, feature_keywords in scorer.feature_keywords.items():
+                columns = [keyword_index[keyword] for keyword in feature_keywords]
+                found = presence[:, columns].any(axis=1) if columns else np.zeros(len(chunk), dtype=bool)
+                accuracy += found * scorer.feature_weights[feature_type]
+            accuracy = np.where(blank, 0.0, np.clip(accuracy, 0, 100))
+            length_score = length_table[np.minimum(lengths, len(length_table) - 1)]
+            total = (
+                accuracy * scorer.scoring_criteria['accuracy'] +
+                length_score * scorer.scoring_criteria['length']
+            )
+            frame[f'score_{suffix}'] = np.round(total, 2)
+            frame[f'label_{suffix}'] = (total >= scorer.label_threshold).astype(np.int64)
+        frames.append(pd.DataFrame(frame))
+
+    diff = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=['row', 'score_a', 'label_a', 'score_b', 'label_b']
+    )
+    diff['score_delta'] = (diff['score_b'] - diff['score_a']).round(2)
+    diff['label_flip'] = np.select(
+        [diff['label_a'] < diff['label_b'], diff['label_a'] > diff['label_b']],
+        ['0→1', '1→0'],
+        ''
+    )
+
+    summary = {
+        'rows': len(diff),
+        'flips_up': int((diff['label_flip'] == '0→1').sum()),
+        'flips_down': int((diff['label_flip'] == '1→0').sum()),
+        'moved_rows': int(((diff['score_delta'] != 0) | (diff['label_flip'] != '')).sum()),
+        'mean_delta': float(diff['score_delta'].mean()) if len(diff) else 0.0,
+        'mean_score_a': float(diff['score_a'].mean()) if len(diff) else 0.0,
+        'mean_score_b': float(diff['score_b'].mean()) if len(diff) else 0.0,
+        'high_quality_a': int(diff['label_a'].sum()),
+        'high_quality_b': int(diff['label_b'].sum())
+    }
+    return diff, summary
+
+def wilson_interval(successes, n, z):
+    """이항 비율의 Wilson 신뢰구간"""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+class ReservoirPreview:
+    """스트림 저수지 표본으로 평균 점수와 고품질 비율을 근사 (시간 예산 단위로 점진적 정밀화)
+
+    각 행에 균등 난수 키를 부여하고 키가 가장 작은 sample_size개를 유지하므로,
+    지금까지 읽은 행에 대해 균등 무작위 표본이 된다. 채점은 표본에 새로 들어온 행만 수행한다.
+    """
+
+    # 청크 하나를 읽는 시간이 시간 예산보다 충분히 짧도록 청크 크기를 바이트 기준으로 정함
+    CHUNK_BYTES = 4 * 2 ** 20
+    MIN_CHUNK_ROWS = 100
+    MAX_CHUNK_ROWS = 50000
+
+    def __init__(self, source, column_name, scorer, sample_size=2000, random_state=None):
+        self.scorer = scorer
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(random_state)
+        self.owns_file = isinstance(source, (str, os.PathLike))
+        if self.owns_file:
+            self.file = open(source, 'rb')
+            self.total_bytes = os.path.getsize(source)
+        else:
+            self.file = source
+            position = source.tell()
+            self.total_bytes = source.seek(0, os.SEEK_END)
+            source.seek(position)
+        sample = _read_encoding_sample(self.file)
+        row_bytes = len(sample) / max(sample.count(b'\n'), 1)
+        chunksize = int(min(self.MAX_CHUNK_ROWS, max(self.MIN_CHUNK_ROWS, self.CHUNK_BYTES // row_bytes)))
+        self.chunks = iter_csv_chunks(self.file, usecols=[column_name], chunksize=chunksize)
+        self.column_name = column_name
+        self.keys = np.empty(0, dtype=np.float64)
+        self.texts = np.empty(0, dtype=object)
+        self.scores = np.empty(0, dtype=np.float64)
+        self.labels = np.empty(0, dtype=np.int64)
+        self.rows_seen = 0
+        self.exhausted = False
+        self.elapsed = 0.0
+
+    def close(self):
+        if self.owns_file and not self.file.closed:
+            self.file.close()
+
+    @property
+    def coverage(self):
+        """지금까지 읽은 바이트 비율"""
+        if self.exhausted or not self.total_bytes:
+            return 1.0
+        try:
+            return min(1.0, self.file.tell() / self.total_bytes)
+        except (OSError, ValueError):
+            return 0.0
+
+    def _add_chunk(self, chunk):
+        column = chunk[self.column_name]
+        texts = column.astype(str).where(column.notna(), "").to_numpy(dtype=object)
+        keys = self.rng.random(len(texts))
+        self.rows_seen += len(texts)
+
+        keys = np.concatenate([self.keys, keys])
+        texts = np.concatenate([self.texts, texts])
+        scores = np.concatenate([self.scores, np.full(len(chunk), np.nan)])
+        labels = np.concatenate([self.labels, np.zeros(len(chunk), dtype=np.int64)])
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            keys, texts, scores, labels = keys[keep], texts[keep], scores[keep], labels[keep]
+        self.keys, self.texts, self.scores, self.labels = keys, texts, scores, labels
+
+    def refine(self, time_budget=1.0):
+        """시간 예산 안에서 스트림을 더 읽고, 표본에 새로 들어온 행만 채점"""
+        started = time.perf_counter()
+        # 채점 시간을 위해 예산의 80%까지만 읽기
+        while not self.exhausted and time.perf_counter() - started < time_budget * 0.8:
+            try:
+                self._add_chunk(next(self.chunks))
+            except StopIteration:
+                self.exhausted = True
+                self.close()
+
+        for index in np.flatnonzero(np.isnan(self.scores)):
+            result = self.scorer.calculate_total_score(self.texts[index])
+            self.scores[index] = result['total_score']
+            self.labels[index] = result['label']
+        self.scorer.flush_score_latency()
+        self.elapsed += time.perf_counter() - started
+        return self.estimate()
+
+    def estimate(self, confidence=0.95):
+        """평균 점수와 고품질 비율의 추정치 및 신뢰구간"""
+        n = len(self.scores)
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        if n == 0:
+            return {'sample_size': 0, 'rows_seen': self.rows_seen, 'coverage': self.coverage}
+
+        mean_score = float(self.scores.mean())
+        high_quality = int(self.labels.sum())
+        if self.exhausted and n >= self.rows_seen:
+            # 전체 행이 표본에 포함된 경우 정확한 값
+            score_margin = 0.0
+            ratio_interval = (high_quality / n, high_quality / n)
+        else:
+            # 전체 행 수를 아는 경우 유한 모집단 보정
+            fpc = math.sqrt((self.rows_seen - n) / (self.rows_seen - 1)) if self.exhausted else 1.0
+            score_margin = z * float(self.scores.std(ddof=1)) / math.sqrt(n) * fpc if n > 1 else float('inf')
+            ratio_interval = wilson_interval(high_quality, n, z)
+
+        coverage = self.coverage
+        return {
+            'sample_size': n,
+            'rows_seen': self.rows_seen,
+            'coverage': coverage,
+            'estimated_total_rows': self.rows_seen if self.exhausted else int(self.rows_seen / coverage) if coverage else None,
+            'exhausted': self.exhausted,
+            'confidence': confidence,
+            'mean_score': mean_score,
+            'mean_score_interval': (mean_score - score_margin, mean_score + score_margin),
+            'high_quality_ratio': high_quality / n,
+            'high_quality_ratio_interval': ratio_interval,
+            'elapsed': self.elapsed
+        }
+
+def build_prompt_texts(df, selected_columns, combine_columns):
+    """분석 대상 텍스트 시리즈 생성 (결측값 제외, 복합 컬럼은 공백으로 결합)
+
+    문자열 dtype을 유지하므로 (pyarrow 설치 시 Arrow 버퍼) 파이썬 문자열은 사용하는 구간만 꺼내 쓴다.
+    """
+    if not combine_columns:
+        column = df[selected_columns[0]]
+        return column.astype(str).where(column.notna(), "")
+
+    combined = None
+    for col in selected_columns:
+        part = df[col].astype(str).where(df[col].notna())
+        if combined is None:
+            combined = part
+        else:
+            combined = combined.str.cat(part, sep=" ").fillna(combined).fillna(part)
+    return combined.fillna("")
+
+def score_text_chunk(scorer, texts, learned_scorer=None, feature_flags=True):
+    """텍스트 청크를 채점해 행별 딕셔너리 대신 열 배열 프레임으로 반환 (feature_flags=False면 특성 플래그 생략)"""
+    texts = list(texts)
+    if learned_scorer is not None:
+        total_scores, labels = learned_scorer.predict(texts)
+        accuracy_scores = np.full(len(texts), np.nan)
+    else:
+        total_scores = np.empty(len(texts), dtype=np.float64)
+        accuracy_scores = np.empty(len(texts), dtype=np.float64)
+        labels = np.empty(len(texts), dtype=np.int8)
+        for index, text in enumerate(texts):
+            result = scorer.calculate_total_score(text)
+            total_scores[index] = result['total_score']
+            accuracy_scores[index] = result['accuracy_score']
+            labels[index] = result['label']
+        scorer.flush_score_latency()
+
+    frame = pd.DataFrame({
+        'label': labels.astype(np.int8),
+        'total_score': total_scores,
+        'accuracy_score': accuracy_scores.astype(np.float32),
+        'text_length': np.fromiter(map(len, texts), dtype=np.int32, count=len(texts))
+    })
+    if feature_flags:
+        flags = scorer.extract_feature_flags(texts)
+        for feature_type in flags.columns:
+            frame[feature_type] = flags[feature_type].to_numpy()
+    return frame
+
+def _fork_worker_metrics(scorer):
+    """포크된 작업자용 새 지표 수집기 (포크 시점에 다른 스레드가 잡고 있던 부모의 잠금을 쓰지 않음)"""
+    scorer.metrics = ScorerMetrics() if scorer.metrics is not None else None
+
+def _batch_worker_loop(scorer, tasks, results, learned_scorer=None, feature_flags=True):
+    """포크된 작업자: 청크를 받아 채점 프레임과 지연 버킷 개수를 돌려줌 (None 수신 시 종료)"""
+    _fork_worker_metrics(scorer)
+    for chunk_index, texts in iter(tasks.get, None):
+        try:
+            frame = score_text_chunk(scorer, texts, learned_scorer, feature_flags)
+            latency = scorer.metrics.drain_score_latency() if scorer.metrics is not None else None
+            results.put((chunk_index, frame, None, latency))
+        except Exception as error:
+            results.put((chunk_index, None, repr(error), None))
+
+def _align8(size):
+    return (size + 7) // 8 * 8
+
+class SharedMemoryBatchScorer:
+    """텍스트를 공유 메모리 Arrow 버퍼에 한 번만 복사하고, 포크된 작업자가 구간을 제자리에서 채점
+
+    텍스트 창(window)마다 large_string 배열의 오프셋·데이터 버퍼를 공유 메모리 블록에 담고,
+    결과(라벨, 점수, 길이, 특성 플래그)와 구간별 채점 지연 버킷 개수는 또 다른 공유 블록의
+    NumPy 배열에 직접 기록한다.
+    작업자는 fork로 두 블록의 매핑을 물려받으므로 행 단위 직렬화(pickle)가 없으며,
+    구간 번호만 공유 카운터로 나누어 가진다. 작업자가 비정상 종료하면 남은 구간은 현재 프로세스에서 채점한다.
+    """
+
+    BASE_COLUMNS = [
+        ('label', np.int8),
+        ('total_score', np.float64),
+        ('accuracy_score', np.float32),
+        ('text_length', np.int32)
+    ]
+
+    def __init__(self, scorer, workers, slice_rows, learned_scorer=None, feature_flags=True):
+        if pa is None:
+            raise ImportError("공유 메모리 채점에는 pyarrow가 필요합니다.")
+        self.scorer = scorer
+        self.workers = workers
+        self.slice_rows = slice_rows
+        self.learned_scorer = learned_scorer
+        self.feature_flags = feature_flags
+        self.columns = list(self.BASE_COLUMNS)
+        if feature_flags:
+            self.columns += [(feature_type, np.bool_) for feature_type in scorer.feature_keywords]
+
+    def _score(self, texts):
+        return score_text_chunk(self.scorer, texts, self.learned_scorer, self.feature_flags)
+
+    def _result_layout(self, rows, slices):
+        """결과 블록 안의 열별 (dtype, 형태, 바이트 오프셋)과 전체 크기"""
+        shapes = {
+            '_done': (slices,),
+            '_latency_counts': (slices, len(ScorerMetrics.LATENCY_BUCKETS) + 1),
+            '_latency_total': (slices,)
+        }
+        internal = [('_done', np.uint8), ('_latency_counts', np.int64), ('_latency_total', np.float64)]
+        layout = {}
+        offset = 0
+        for column, dtype in self.columns + internal:
+            shape = shapes.get(column, (rows,))
+            layout[column] = (dtype, shape, offset)
+            offset += _align8(np.dtype(dtype).itemsize * int(np.prod(shape)))
+        return layout, max(offset, 1)
+
+    @staticmethod
+    def _result_arrays(buffer, layout):
+        return {
+            column: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for column, (dtype, shape, offset) in layout.items()
+        }
+
+    @staticmethod
+    def _write_texts(texts):
+        """텍스트를 large_string Arrow 배열로 변환해 공유 블록에 복사 (블록, 오프셋 크기, 데이터 크기)"""
+        array = pa.array(texts, type=pa.large_string())
+        _, offsets, data = array.buffers()
+        offsets_size = (len(array) + 1) * 8
+        data_size = data.size if data is not None else 0
+        block = shared_memory.SharedMemory(create=True, size=max(offsets_size + data_size, 1))
+        view = np.ndarray(offsets_size + data_size, dtype=np.uint8, buffer=block.buf)
+        view[:offsets_size] = np.frombuffer(offsets, dtype=np.uint8, count=offsets_size)
+        if data_size:
+            view[offsets_size:] = np.frombuffer(data, dtype=np.uint8, count=data_size)
+        del view
+        return block, offsets_size, data_size
+
+    def _worker(self, text_block, offsets_size, data_size, rows, result_block, layout, slices, next_slice, errors):
+        """포크된 작업자: 공유 Arrow 버퍼에서 구간을 읽어 채점하고 공유 결과 배열에 기록"""
+        _fork_worker_metrics(self.scorer)
+        texts = pa.Array.from_buffers(pa.large_string(), rows, [
+            None,
+            pa.py_buffer(text_block.buf[:offsets_size]),
+            pa.py_buffer(text_block.buf[offsets_size:offsets_size + data_size])
+        ])
+        results = self._result_arrays(result_block.buf, layout)
+        while True:
+            with next_slice.get_lock():
+                slice_index = next_slice.value
+                next_slice.value += 1
+            if slice_index >= slices:
+                return
+            start = slice_index * self.slice_rows
+            stop = min(start + self.slice_rows, rows)
+            try:
+                frame = self._score(texts.slice(start, stop - start).to_pylist())
+                for column, _ in self.columns:
+                    results[column][start:stop] = frame[column].to_numpy()
+                if self.scorer.metrics is not None:
+                    counts, total = self.scorer.metrics.drain_score_latency()
+                    results['_latency_counts'][slice_index] = counts
+                    results['_latency_total'][slice_index] = total
+                results['_done'][slice_index] = 1
+            except Exception as error:
+                errors.put((slice_index, repr(error)))
+                return
+
+    def score_window(self, texts):
+        """텍스트 창 하나를 병렬 채점해 구간별 결과 프레임을 입력 순서대로 생성"""
+        rows = len(texts)
+        slices = -(-rows // self.slice_rows)
+        layout, result_size = self._result_layout(rows, slices)
+        context = multiprocessing.get_context('fork')
+        next_slice = context.Value('q', 0)
+        errors = context.SimpleQueue()
+        text_block, offsets_size, data_size = self._write_texts(texts)
+        result_block = shared_memory.SharedMemory(create=True, size=result_size)
+        results = self._result_arrays(result_block.buf, layout)
+        results['_done'][:] = 0
+        results['_latency_counts'][:] = 0
+        results['_latency_total'][:] = 0.0
+        processes = [
+            context.Process(
+                target=self._worker,
+                args=(text_block, offsets_size, data_size, rows, result_block, layout, slices, next_slice, errors),
+                daemon=True
+            )
+            for _ in range(min(self.workers, slices))
+        ]
+        try:
+            for process in processes:
+                process.start()
+            for slice_index in range(slices):
+                start = slice_index * self.slice_rows
+                stop = min(start + self.slice_rows, rows)
+                while not results['_done'][slice_index]:
+                    if not errors.empty():
+                        failed_slice, error = errors.get()
+                        raise RuntimeError(f"구간 {failed_slice} 채점 실패: {error}")
+                    if not any(process.is_alive() for process in processes):
+                        # 작업자가 모두 종료되었는데 남은 구간이 있으면 현재 프로세스에서 채점
+                        frame = self._score(texts[start:stop])
+                        for column, _ in self.columns:
+                            results[column][start:stop] = frame[column].to_numpy()
+                        results['_done'][slice_index] = 1
+                        break
+                    time.sleep(0.005)
+                if self.scorer.metrics is not None and results['_latency_counts'][slice_index].any():
+                    self.scorer.metrics.merge_score_latency(
+                        results['_latency_counts'][slice_index], results['_latency_total'][slice_index]
+                    )
+                yield pd.DataFrame({column: results[column][start:stop].copy() for column, _ in self.columns})
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            del results
+            for block in (text_block, result_block):
+                block.close()
+                block.unlink()
+
+class BatchScoreResult:
+    """청크별 채점 프레임 모음 (메모리 보관분과 디스크로 내보낸 파트가 입력 순서대로 섞여 있음)"""
+
+    def __init__(self, parts, spill_dir, engine, plan):
+        self.parts = parts
+        self.spill_dir = spill_dir
+        self.engine = engine
+        self.plan = plan
+        self.rows = sum(rows for _, rows in parts)
+
+    @property
+    def spilled_parts(self):
+        return sum(isinstance(part, str) for part, _ in self.parts)
+
+    def iter_parts(self, columns=None):
+        for part, _ in self.parts:
+            if not isinstance(part, str):
+                yield part if columns is None else part[columns]
+            elif part.endswith('.parquet'):
+                yield pd.read_parquet(part, columns=columns)
+            else:
+                with np.load(part) as arrays:
+                    yield pd.DataFrame({name: arrays[name] for name in (columns or arrays.files)})
+
+    def load(self, columns=None, index=None):
+        """파트를 이어 붙인 채점 프레임 (필요한 열만 읽기)"""
+        frames = list(self.iter_parts(columns))
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        if index is not None:
+            frame.index = index
+        return frame
+
+    @property
+    def score_columns(self):
+        return ['label', 'total_score'] + (['accuracy_score'] if self.engine == 'rule' else []) + ['temperature_setting']
+
+    def iter_result_frames(self, df, temperature, extra_columns=None):
+        """원본 행과 채점 열을 청크 크기 단위로 결합 (메모리에 보관한 큰 파트도 나누어 복사)"""
+        step = self.plan['chunk_rows']
+        start = 0
+        for part in self.iter_parts(self.score_columns[:-1]):
+            for offset in range(0, len(part), step):
+                scores = part.iloc[offset:offset + step]
+                chunk = df.iloc[start + offset:start + offset + len(scores)].copy()
+                for column, value in (extra_columns or {}).items():
+                    chunk[column] = value
+                for column in self.score_columns[:-1]:
+                    chunk[column] = scores[column].to_numpy()
+                chunk['temperature_setting'] = temperature
+                yield chunk
+            start += len(part)
+
+    def head(self, rows, columns=None):
+        """앞쪽 rows행만 읽기 (미리보기용, 필요한 파트까지만 로드)"""
+        frames = []
+        remaining = rows
+        for part in self.iter_parts(columns):
+            if remaining <= 0:
+                break
+            frames.append(part.iloc[:remaining])
+            remaining -= len(frames[-1])
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    def write_csv(self, path, df, temperature):
+        """원본 행과 채점 열을 결합한 CSV를 파트 단위로 파일에 기록 (UTF-8 BOM 포함)"""
+        with open(path, 'wb') as f:
+            f.write(codecs.BOM_UTF8)
+            for position, chunk in enumerate(self.iter_result_frames(df, temperature)):
+                f.write(chunk.to_csv(index=False, header=position == 0).encode('utf-8'))
+        return path
+
+    def cleanup(self):
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+class BudgetedBatchRunner:
+    """메모리 예산 안에서 청크 단위로 채점하고, 보관 중인 결과가 예산을 넘으면 디스크로 내보냄
+
+    청크 크기와 작업자 수는 BatchMemoryGovernor의 현재 몫에서 호출자가 보유한 텍스트 열 크기를 뺀
+    나머지와 표본 행 크기로 정한다. 텍스트는 청크마다 해당 구간만 파이썬 문자열로 꺼낸다.
+    작업자에게는 SharedMemoryBatchScorer로 텍스트를 넘긴다 (pyarrow 미설치 시 큐로 청크 전달).
+    결과는 행별 딕셔너리 대신 열 배열(라벨, 점수, 길이, 특성 플래그)로 보관하고,
+    몫의 일정 비율을 넘으면 Parquet 파일(pyarrow 미설치 시 npz)로 내보낸다.
+    """
+
+    MIN_CHUNK_ROWS = 500
+    MAX_CHUNK_ROWS = 100000
+    WORKER_MEMORY_BYTES = 256 * 2 ** 20
+    WORKING_SET_FRACTION = 0.25
+    SPILL_FRACTION = 0.25
+    RESULT_ROW_BYTES = 512  # calculate_total_score가 행마다 잠시 만드는 근거 딕셔너리 포함
+
+    def __init__(self, scorer, governor, learned_scorer=None, max_workers=None, spill_root=None, feature_flags=True):
+        self.scorer = scorer
+        self.governor = governor
+        self.learned_scorer = learned_scorer
+        self.engine = 'rule' if learned_scorer is None else 'model'
+        self.feature_flags = feature_flags
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        # 포크를 지원하지 않는 플랫폼에서는 스크립트 재실행을 피하기 위해 프로세스 내에서만 채점
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            max_workers = 1
+        self.max_workers = max_workers
+        self.spill_root = spill_root or os.environ.get('PROMPT_SCORER_SPILL_DIR') or tempfile.gettempdir()
+
+    def estimate_row_bytes(self, texts, sample_size=1000):
+        """표본 텍스트로 추정한 행당 작업 메모리 (텍스트 + 결과)"""
+        if not len(texts):
+            return self.RESULT_ROW_BYTES
+        step = max(1, len(texts) // sample_size)
+        sample = texts.iloc[::step].iloc[:sample_size].tolist()
+        return int(sum(map(sys.getsizeof, sample)) / len(sample)) + self.RESULT_ROW_BYTES
+
+    def estimate_text_bytes(self, texts, row_bytes):
+        """호출자가 보유한 텍스트 열의 메모리 (Arrow 문자열은 버퍼 크기, 파이썬 문자열은 표본 추정)"""
+        if isinstance(texts.dtype, pd.StringDtype) and texts.dtype.storage == 'pyarrow':
+            return int(texts.array.nbytes)
+        return len(texts) * max(row_bytes - self.RESULT_ROW_BYTES, 0)
+
+    def plan(self, texts, row_bytes=None, text_bytes=None):
+        """현재 메모리 몫에 맞춘 작업자 수, 청크 크기, 내보내기 기준"""
+        share = self.governor.share()
+        row_bytes = row_bytes or self.estimate_row_bytes(texts)
+        if text_bytes is None:
+            text_bytes = self.estimate_text_bytes(texts, row_bytes)
+        # 텍스트 열이 몫을 거의 다 차지해도 청크 채점은 계속할 수 있도록 최소 1/8은 남김
+        available = max(share - text_bytes, share // 8)
+        workers = max(1, min(self.max_workers, int(available // 2 // self.WORKER_MEMORY_BYTES)))
+        if len(texts) < self.MIN_CHUNK_ROWS * 2:
+            workers = 1
+        # 작업자마다 대기 청크와 처리 중 청크를 하나씩 보유하고, 전달 과정에서 사본이 하나 더 생김
+        in_flight = workers * 2 * (2 if workers > 1 else 1)
+        chunk_rows = int(available * self.WORKING_SET_FRACTION // (in_flight * row_bytes))
+        if workers > 1:
+            # 작업자 사이 부하 균형을 위해 작업자당 청크 4개 이상
+            chunk_rows = min(chunk_rows, -(-len(texts) // (workers * 4)))
+        return {
+            'share_bytes': share,
+            'text_bytes': text_bytes,
+            'row_bytes': row_bytes,
+            'workers': workers,
+            'chunk_rows': max(self.MIN_CHUNK_ROWS, min(self.MAX_CHUNK_ROWS, chunk_rows)),
+            'spill_bytes': int(available * self.SPILL_FRACTION)
+        }
+
+    def _iter_chunks(self, texts, row_bytes, text_bytes):
+        """청크마다 몫을 다시 조회해 동시 작업 수 변화에 맞춰 크기 조정"""
+        start = 0
+        while start < len(texts):
+            stop = start + self.plan(texts, row_bytes, text_bytes)['chunk_rows']
+            yield texts.iloc[start:stop].tolist()
+            start = stop
+
+    def _score_chunk(self, texts):
+        return score_text_chunk(self.scorer, texts, self.learned_scorer, self.feature_flags)
+
+    def _score_sequential(self, texts, row_bytes, text_bytes):
+        for chunk in self._iter_chunks(texts, row_bytes, text_bytes):
+            yield self._score_chunk(chunk)
+
+    def _score_shared(self, texts, row_bytes, text_bytes, plan):
+        """메모리 몫에 맞는 창 단위로 텍스트를 공유 메모리에 올려 작업자들이 제자리에서 채점"""
+        shared_scorer = SharedMemoryBatchScorer(
+            self.scorer, plan['workers'], plan['chunk_rows'], self.learned_scorer, self.feature_flags
+        )
+        start = 0
+        while start < len(texts):
+            # 창은 매번 현재 몫으로 다시 계산 (공유 블록에는 텍스트 사본이 하나만 존재)
+            available = max(self.governor.share() - text_bytes, self.governor.share() // 8)
+            window_rows = max(plan['chunk_rows'], int(available * self.WORKING_SET_FRACTION // row_bytes))
+            yield from shared_scorer.score_window(texts.iloc[start:start + window_rows].tolist())
+            start += window_rows
+
+    def _score_parallel(self, texts, row_bytes, text_bytes, workers):
+        """포크된 작업자에게 청크를 큐로 나누어 주고 입력 순서대로 결과 반환 (pyarrow 미설치 시, 대기 청크 수 제한)"""
+        context = multiprocessing.get_context('fork')
+        tasks = context.Queue()
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_batch_worker_loop,
+                args=(self.scorer, tasks, results, self.learned_scorer, self.feature_flags),
+                daemon=True
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        chunks = enumerate(self._iter_chunks(texts, row_bytes, text_bytes))
+        submitted = {}
+        finished = {}
+        next_index = 0
+        try:
+            for chunk_index, chunk in chunks:
+                tasks.put((chunk_index, chunk))
+                submitted[chunk_index] = chunk
+                if len(submitted) >= workers * 2:
+                    break
+            while submitted:
+                try:
+                    chunk_index, frame, error, latency = results.get(timeout=1.0)
+                except queue.Empty:
+                    if all(process.is_alive() for process in processes):
+                        continue
+                    # 작업자가 비정상 종료되면 남은 청크를 현재 프로세스에서 채점
+                    for chunk_index in sorted(submitted):
+                        finished[chunk_index] = self._score_chunk(submitted[chunk_index])
+                    submitted.clear()
+                    for chunk_index, chunk in chunks:
+                        finished[chunk_index] = self._score_chunk(chunk)
+                else:
+                    if error is not None:
+                        raise RuntimeError(f"청크 {chunk_index} 채점 실패: {error}")
+                    if latency is not None and self.scorer.metrics is not None:
+                        self.scorer.metrics.merge_score_latency(*latency)
+                    finished[chunk_index] = frame
+                    del submitted[chunk_index]
+                    for next_chunk_index, chunk in chunks:
+                        tasks.put((next_chunk_index, chunk))
+                        submitted[next_chunk_index] = chunk
+                        break
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    tasks.put(None)
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+    def _spill(self, frames, spill_dir, part_index):
+        frame = pd.concat(frames, ignore_index=True)
+        if pq is not None:
+            path = os.path.join(spill_dir, f"part-{part_index:05d}.parquet")
+            frame.to_parquet(path, index=False)
+        else:
+            path = os.path.join(spill_dir, f"part-{part_index:05d}.npz")
+            np.savez(path, **{column: frame[column].to_numpy() for column in frame.columns})
+        if self.scorer.metrics is not None:
+            self.scorer.metrics.add_spilled_bytes(os.path.getsize(path))
+        return path, len(frame)
+
+    def run(self, texts, progress=None):
+        """전체 텍스트 채점 (texts는 시리즈 또는 리스트, progress(완료 행, 전체 행) 콜백 선택)"""
+        if not isinstance(texts, pd.Series):
+            texts = pd.Series(texts, dtype=object)
+        row_bytes = self.estimate_row_bytes(texts)
+        text_bytes = self.estimate_text_bytes(texts, row_bytes)
+        plan = self.plan(texts, row_bytes, text_bytes)
+        if plan['workers'] > 1 and pa is not None:
+            frames = self._score_shared(texts, row_bytes, text_bytes, plan)
+        elif plan['workers'] > 1:
+            frames = self._score_parallel(texts, row_bytes, text_bytes, plan['workers'])
+        else:
+            frames = self._score_sequential(texts, row_bytes, text_bytes)
+
+        parts = []
+        held = []
+        held_bytes = 0
+        rows_done = 0
+        spill_dir = None
+        try:
+            for frame in frames:
+                held.append(frame)
+                held_bytes += int(frame.memory_usage(index=False).sum())
+                rows_done += len(frame)
+                if held_bytes > self.plan(texts, row_bytes, text_bytes)['spill_bytes']:
+                    if spill_dir is None:
+                        spill_dir = tempfile.mkdtemp(prefix='prompt_scorer_spill_', dir=self.spill_root)
+                    parts.append(self._spill(held, spill_dir, len(parts)))
+                    held = []
+                    held_bytes = 0
+                if progress is not None:
+                    progress(rows_done, len(texts))
+        except BaseException:
+            if spill_dir is not None:
+                shutil.rmtree(spill_dir, ignore_errors=True)
+            raise
+        if held:
+            parts.append((pd.concat(held, ignore_index=True), sum(len(frame) for frame in held)))
+        if self.scorer.metrics is not None:
+            self.scorer.metrics.add_rows_scored(self.engine, rows_done)
+        return BatchScoreResult(parts, spill_dir, self.engine, plan)
+
+class MultiFileBatchPipeline:
+    """여러 CSV 파일을 미리 읽기와 채점을 겹쳐 처리하는 제한된 파이프라인
+
+    읽기 스레드가 다음 파일들을 파싱하는 동안 호출 스레드가 현재 파일을 BudgetedBatchRunner로
+    채점한다. 미리 읽는 파일 수는 메모리 몫과 가장 큰 파일 크기로 제한하므로, 파일이 수백 개여도
+    메모리에 동시에 올라오는 원본은 몇 개뿐이다. 결과는 입력 순서대로 병합 CSV에 이어 쓴다.
+    """
+
+    PARSED_SIZE_FACTOR = 3  # CSV 바이트 대비 파싱된 DataFrame 메모리 추정 배율
+
+    def __init__(self, scorer, governor, text_column, reader_threads=4):
+        self.scorer = scorer
+        self.governor = governor
+        self.text_column = text_column
+        self.reader_threads = reader_threads
+
+    def read_ahead(self, sources):
+        """현재 메모리 몫에 담을 수 있는 미리 읽기 파일 수"""
+        largest = max((csv_source_size(source) for _, source in sources), default=0)
+        if not largest:
+            return self.reader_threads
+        fit = int(self.governor.share() // 2 // (largest * self.PARSED_SIZE_FACTOR))
+        return max(1, min(self.reader_threads, fit))
+
+    @staticmethod
+    def _read(source):
+        started = time.perf_counter()
+        df = read_csv_fast(source)
+        return df, time.perf_counter() - started
+
+    def run(self, sources, output, progress=None, columns=None):
+        """파일별로 채점해 output(바이너리 파일 객체)에 병합 CSV를 쓰고 (채점 프레임, 파일별 통계, 실패 목록) 반환
+
+        채점 프레임에는 source_file 열(범주형)이 포함된다. 병합 CSV의 원본 컬럼은 columns(모든 파일
+        헤더의 합집합)를 따르고, 파일에 없는 컬럼은 빈 값으로 채운다 (None이면 첫 번째 파일 기준).
+        """
+        runner = BudgetedBatchRunner(self.scorer, self.governor)
+        read_ahead = self.read_ahead(sources)
+        score_columns = ['label', 'total_score', 'text_length'] + list(self.scorer.feature_keywords)
+        output.write(codecs.BOM_UTF8)
+        output_columns = None
+        header_written = False
+        frames = []
+        file_stats = []
+        failures = []
+
+        with ThreadPoolExecutor(max_workers=read_ahead) as executor:
+            pending = deque()
+            remaining = iter(enumerate(sources))
+
+            def submit_next():
+                for index, (name, source) in remaining:
+                    pending.append((index, name, executor.submit(self._read, source)))
+                    return
+
+            for _ in range(read_ahead):
+                submit_next()
+            while pending:
+                index, name, future = pending.popleft()
+                # 현재 파일을 채점하는 동안 다음 파일 읽기를 진행
+                submit_next()
+                try:
+                    df, read_seconds = future.result()
+                    if self.text_column not in df.columns:
+                        raise ValueError(f"'{self.text_column}' 컬럼이 없습니다.")
+                except Exception as error:
+                    failures.append({'file': name, 'error': str(error)})
+                    if progress is not None:
+                        progress(len(file_stats) + len(failures), len(sources))
+                    continue
+
+                started = time.perf_counter()
+                batch = runner.run(build_prompt_texts(df, [self.text_column], False))
+                try:
+                    if output_columns is None:
+                        output_columns = ['source_file'] + [
+                            column for column in (df.columns if columns is None else columns)
+                            if column not in batch.score_columns
+                        ] + batch.score_columns
+                    for chunk in batch.iter_result_frames(df, self.scorer.optimal_temperature, {'source_file': name}):
+                        output.write(chunk.reindex(columns=output_columns).to_csv(index=False, header=not header_written).encode('utf-8'))
+                        header_written = True
+                    scores = batch.load(score_columns)
+                finally:
+                    batch.cleanup()
+                scores['file_index'] = np.int32(index)
+                frames.append(scores)
+                file_stats.append({
+                    'file': name,
+                    'rows': len(scores),
+                    'average_score': float(scores['total_score'].mean()) if len(scores) else 0.0,
+                    'high_quality': int(scores['label'].sum()),
+                    'high_quality_ratio': float(scores['label'].mean()) if len(scores) else 0.0,
+                    'read_seconds': read_seconds,
+                    'score_seconds': time.perf_counter() - started
+                })
+                del df
+                if progress is not None:
+                    progress(len(file_stats) + len(failures), len(sources))
+
+        frames = [frame for frame in frames if len(frame)]
+        result_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=score_columns + ['file_index'])
+        source_names = np.array([name for name, _ in sources], dtype=object)
+        result_df['source_file'] = pd.Categorical(source_names[result_df.pop('file_index').to_numpy(dtype=np.int64)])
+        return result_df, pd.DataFrame(file_stats), pd.DataFrame(failures, columns=['file', 'error'])
+
+def iter_scored_text_chunks(csv_source, column_name, scorer, chunksize=50000):
+    """CSV를 청크 단위로 읽으며 (텍스트, 라벨) 쌍을 생성 (전체 파일을 메모리에 올리지 않음)"""
+    for chunk in iter_csv_chunks(csv_source, usecols=[column_name], chunksize=chunksize):
+        column = chunk[column_name]
+        texts = column.where(column.notna(), "").astype(str).tolist()
+        labels = [scorer.calculate_total_score(text)['label'] for text in texts]
+        scorer.flush_score_latency()
+        yield texts, labels
+
+def find_korean_font():
+    """워드클라우드용 한글 폰트 경로 탐색"""
+    candidates = [
+        os.environ.get('PROMPT_SCORER_FONT_PATH', ''),
+        '/usr/share/fonts/truetype/nanum/NanumGothic.ttf',
+        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+        '/System/Library/Fonts/AppleSDGothicNeo.ttc',
+        'C:/Windows/Fonts/malgun.ttf'
+    ]
+    for path in candidates:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+def render_term_analysis(term_analyzer):
+    """라벨별 워드클라우드와 구분 어휘 출력"""
+    st.subheader("🔤 코퍼스 어휘 분석")
+
+    font_path = find_korean_font()
+    if font_path is None:
+        st.caption("한글 폰트를 찾지 못했습니다. PROMPT_SCORER_FONT_PATH 환경변수로 폰트 경로를 지정하세요.")
+
+    cloud_col1, cloud_col2 = st.columns(2)
+    for label_value, column, title in ((1, cloud_col1, "✅ 고품질 (라벨=1)"), (0, cloud_col2, "⚠️ 저품질 (라벨=0)")):
+        with column:
+            st.write(f"**{title}** - {term_analyzer.document_counts[label_value]:,}개 문서")
+            frequencies = term_analyzer.top_terms(label_value)
+            if frequencies:
+                cloud = WordCloud(
+                    font_path=font_path, width=800, height=400, background_color='white'
+                ).generate_from_frequencies(frequencies)
+                st.image(cloud.to_array(), use_container_width=True)
+            else:
+                st.info("표시할 어휘가 없습니다.")
+
+    if term_analyzer.document_counts.all():
+        discriminative = term_analyzer.discriminative_terms()
+        term_col1, term_col2 = st.columns(2)
+        with term_col1:
+            st.write("**고품질을 구분하는 어휘:**")
+            st.dataframe(discriminative['high_quality'], use_container_width=True)
+        with term_col2:
+            st.write("**저품질을 구분하는 어휘:**")
+            st.dataframe(discriminative['low_quality'], use_container_width=True)
+
+def analyze_corpus_terms_streaming(scorer):
+    """서버 경로의 대용량 CSV를 스트리밍하여 어휘 분석"""
+    with st.expander("🔤 대용량 어휘 분석 (스트리밍)", expanded=False):
+        st.caption("메모리보다 큰 CSV도 청크 단위로 읽어 라벨별 어휘 빈도를 누적합니다.")
+        csv_path = st.text_input("서버 CSV 경로:", key="term_stream_path")
+        column_name = st.text_input("텍스트 컬럼명:", key="term_stream_column")
+        chunksize = st.number_input("청크 크기 (행):", min_value=1000, value=50000, step=1000, key="term_stream_chunksize")
+
+        if st.button("어휘 분석 시작", key="term_stream_start", disabled=not (csv_path and column_name)):
+            if not os.path.exists(csv_path):
+                st.error(f"❌ 파일을 찾을 수 없습니다: {csv_path}")
+                return
+            try:
+                term_analyzer = CorpusTermAnalyzer()
+                status = st.empty()
+                processed = 0
+                with track_batch(scorer.metrics, 'term_stream'):
+                    for texts, labels in iter_scored_text_chunks(csv_path, column_name, scorer, int(chunksize)):
+                        term_analyzer.partial_fit(texts, labels)
+                        processed += len(texts)
+                        if scorer.metrics is not None:
+                            scorer.metrics.add_rows_scored('rule', len(texts))
+                        status.info(f"{processed:,}행 처리 중...")
+                status.success(f"✅ {processed:,}행 어휘 분석 완료")
+                render_term_analysis(term_analyzer)
+            except Exception as e:
+                st.error(f"❌ 어휘 분석 오류: {str(e)}")
+
+class ShardedBatchJob:
+    """공유 파일시스템 기반 분산 배치 작업 (락 파일 작업 큐)
+
+    작업 디렉터리 구조:
+        manifest.json          파티션 목록과 규칙 설정 해시
+        partitions/<id>.*      코디네이터가 분할한 입력
+        claims/<id>.lock       워커 점유 표시 (O_EXCL 생성, 내용 = 점유 토큰, mtime = 하트비트)
+        results/<id>.*         채점 결과 파트 파일
+        stats/<id>.json        파트별 통계 (완료 표시)
+        failures/<id>.json     실패 횟수와 마지막 오류
+    """
+
+    def __init__(self, job_dir):
+        self.job_dir = job_dir
+        self.manifest_path = os.path.join(job_dir, 'manifest.json')
+        self._manifest = None
+        # 이 인스턴스가 점유 중인 파티션별 락 토큰
+        self._claims = {}
+
+    def _path(self, kind, partition_id, extension):
+        return os.path.join(self.job_dir, kind, f"{partition_id}.{extension}")
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    @staticmethod
+    def _write_json_atomic(path, payload):
+        temp_path = f"{path}.tmp.{os.getpid()}"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_frame(self, df, kind, partition_id):
+        """파트 파일을 임시 경로에 쓴 뒤 원자적으로 교체"""
+        extension = self.manifest['format']
+        path = self._path(kind, partition_id, extension)
+        temp_path = f"{path}.tmp.{os.getpid()}"
+        if extension == 'parquet':
+            df.to_parquet(temp_path, index=False)
+        else:
+            df.to_csv(temp_path, index=False, encoding='utf-8')
+        os.replace(temp_path, path)
+        return path
+
+    def _read_columns(self, kind, partition_id):
+        """파트 파일의 컬럼명만 읽기"""
+        path = self._path(kind, partition_id, self.manifest['format'])
+        if self.manifest['format'] == 'parquet':
+            return pq.read_schema(path).names
+        return read_csv_columns(path, encoding='utf-8')
+
+    def _read_frame(self, kind, partition_id):
+        path = self._path(kind, partition_id, self.manifest['format'])
+        if self.manifest['format'] == 'parquet':
+            return pd.read_parquet(path)
+        return read_csv_fast(path, encoding='utf-8')
+
+    @classmethod
+    def create(cls, input_paths, job_dir, text_column, scorer, rows_per_partition=1000000):
+        """코디네이터: 입력 파일을 파티션으로 분할하고 작업 매니페스트 작성"""
+        job = cls(job_dir)
+        if os.path.exists(job.manifest_path):
+            raise FileExistsError(f"이미 작업이 존재합니다: {job.manifest_path}")
+        for kind in ('partitions', 'claims', 'results', 'stats', 'failures'):
+            os.makedirs(os.path.join(job_dir, kind), exist_ok=True)
+
+        job._manifest = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'text_column': text_column,
+            'format': 'parquet' if pq is not None else 'csv',
+            'rules_fingerprint': scorer.config_fingerprint(),
+            'partitions': []
+        }
+
+        def flush(frame, source_path):
+            partition_id = f"part-{len(job._manifest['partitions']):05d}"
+            job._write_frame(frame, 'partitions', partition_id)
+            job._manifest['partitions'].append({
+                'id': partition_id,
+                'source_file': os.path.basename(source_path),
+                'rows': len(frame)
+            })
+
+        for source_path in input_paths:
+            buffer, buffered_rows = [], 0
+            for chunk in iter_csv_chunks(source_path, chunksize=min(rows_per_partition, 50000)):
+                if text_column not in chunk.columns:
+                    raise KeyError(f"{source_path}에 '{text_column}' 컬럼이 없습니다.")
+                buffer.append(chunk)
+                buffered_rows += len(chunk)
+                if buffered_rows >= rows_per_partition:
+                    # 청크 경계와 무관하게 파티션은 정확히 rows_per_partition행
+                    frame = pd.concat(buffer, ignore_index=True)
+                    flush(frame.iloc[:rows_per_partition], source_path)
+                    rest = frame.iloc[rows_per_partition:]
+                    buffer, buffered_rows = ([rest] if len(rest) else []), len(rest)
+            if buffer:
+                flush(pd.concat(buffer, ignore_index=True), source_path)
+
+        cls._write_json_atomic(job.manifest_path, job._manifest)
+        return job
+
+    @staticmethod
+    def _read_lock(lock_path):
+        try:
+            with open(lock_path, encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _remove_lock(self, lock_path, expected_token, lease_seconds=None):
+        """락을 고유 이름으로 옮긴 뒤 토큰(과 만료 여부)이 예상과 같을 때만 삭제
+
+        확인과 이름 변경 사이에 다른 워커가 락을 새로 만들었다면 옮긴 락을 원래 경로로 되돌린다.
+        """
+        moved_path = f"{lock_path}.{uuid.uuid4().hex}"
+        try:
+            os.replace(lock_path, moved_path)
+        except FileNotFoundError:
+            return False
+        removable = self._read_lock(moved_path) == expected_token
+        if removable and lease_seconds is not None:
+            removable = time.time() - os.path.getmtime(moved_path) > lease_seconds
+        if not removable:
+            try:
+                os.link(moved_path, lock_path)
+            except FileExistsError:
+                pass
+        os.remove(moved_path)
+        return removable
+
+    def _try_claim(self, partition_id, worker_id, lease_seconds):
+        """락 파일 생성으로 파티션 점유 (점유마다 고유 토큰을 기록, 만료된 락은 토큰 확인 후 회수)"""
+        lock_path = self._path('claims', partition_id, 'lock')
+        token = f"{worker_id}/{uuid.uuid4().hex}"
+        for _ in range(2):
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                stale_token = self._read_lock(lock_path)
+                try:
+                    if stale_token is not None and time.time() - os.path.getmtime(lock_path) <= lease_seconds:
+                        return False
+                except FileNotFoundError:
+                    continue
+                if stale_token is not None and not self._remove_lock(lock_path, stale_token, lease_seconds):
+                    if os.path.exists(lock_path):
+                        return False
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(token)
+            self._claims[partition_id] = token
+            return True
+        return False
+
+    def _heartbeat(self, partition_id):
+        """자신의 락일 때만 mtime 갱신 (다른 워커가 회수했으면 False)"""
+        lock_path = self._path('claims', partition_id, 'lock')
+        token = self._claims.get(partition_id)
+        if token is None or self._read_lock(lock_path) != token:
+            return False
+        try:
+            os.utime(lock_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _release(self, partition_id):
+        """자신의 락일 때만 삭제"""
+        token = self._claims.pop(partition_id, None)
+        if token is not None:
+            self._remove_lock(self._path('claims', partition_id, 'lock'), token)
+
+    def _attempts(self, partition_id):
+        failure = self._read_json(self._path('failures', partition_id, 'json'))
+        return failure['attempts'] if failure else 0
+
+    def _is_done(self, partition_id):
+        return os.path.exists(self._path('stats', partition_id, 'json'))
+
+    def score_partition(self, partition_id, scorer, worker_id, heartbeat_rows=10000):
+        """파티션 하나를 채점하여 결과 파트와 통계 기록 (점유를 잃으면 기록 없이 False)"""
+        with track_batch(scorer.metrics, 'shard'):
+            completed = self._score_partition(partition_id, scorer, worker_id, heartbeat_rows)
+            scorer.flush_score_latency()
+        if completed and scorer.metrics is not None:
+            scorer.metrics.add_rows_scored('rule', self._read_json(self._path('stats', partition_id, 'json'))['rows'])
+        return completed
+
+    def _score_partition(self, partition_id, scorer, worker_id, heartbeat_rows):
+        started = time.perf_counter()
+        df = self._read_frame('partitions', partition_id)
+        texts = build_prompt_texts(df, [self.manifest['text_column']], False).tolist()
+
+        labels = np.empty(len(texts), dtype=np.int64)
+        total_scores = np.empty(len(texts), dtype=np.float64)
+        accuracy_scores = np.empty(len(texts), dtype=np.float64)
+        for idx, text in enumerate(texts):
+            result = scorer.calculate_total_score(text)
+            labels[idx] = result['label']
+            total_scores[idx] = result['total_score']
+            accuracy_scores[idx] = result['accuracy_score']
+            if (idx + 1) % heartbeat_rows == 0 and not self._heartbeat(partition_id):
+                # 임대가 만료되어 다른 워커가 회수함: 결과를 쓰지 않고 중단
+                return False
+
+        source_file = next(p['source_file'] for p in self.manifest['partitions'] if p['id'] == partition_id)
+        df['label'] = labels
+        df['total_score'] = total_scores
+        df['accuracy_score'] = accuracy_scores
+        df['source_file'] = source_file
+        self._write_frame(df, 'results', partition_id)
+        self._write_json_atomic(self._path('stats', partition_id, 'json'), {
+            'rows': len(df),
+            'score_sum': float(total_scores.sum()),
+            'high_quality': int(labels.sum()),
+            'seconds': round(time.perf_counter() - started, 3),
+            'worker': worker_id
+        })
+        return True
+
+    def run_worker(self, scorer, worker_id=None, lease_seconds=600, max_attempts=3):
+        """워커: 점유 가능한 파티션이 없을 때까지 채점 (완료 파티션은 건너뜀)"""
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        if scorer.config_fingerprint() != self.manifest['rules_fingerprint']:
+            raise ValueError("작업 생성 시점과 채점 규칙 설정이 다릅니다.")
+
+        processed = []
+        claimed_any = True
+        # 실패한 파티션은 다음 순회에서 재시도 (max_attempts까지)
+        while claimed_any:
+            claimed_any = False
+            for partition in self.manifest['partitions']:
+                partition_id = partition['id']
+                if self._is_done(partition_id) or self._attempts(partition_id) >= max_attempts:
+                    continue
+                if not self._try_claim(partition_id, worker_id, lease_seconds):
+                    continue
+                claimed_any = True
+                try:
+                    # 점유 직전에 다른 워커가 완료했을 수 있음
+                    if not self._is_done(partition_id) and self.score_partition(partition_id, scorer, worker_id):
+                        processed.append(partition_id)
+                except Exception as e:
+                    self._write_json_atomic(self._path('failures', partition_id, 'json'), {
+                        'attempts': self._attempts(partition_id) + 1,
+                        'last_error': f"{type(e).__name__}: {e}",
+                        'worker': worker_id
+                    })
+                finally:
+                    self._release(partition_id)
+        return processed
+
+    def status(self, max_attempts=3):
+        """파티션별 상태 (done / running / failed / pending)"""
+        rows = []
+        for partition in self.manifest['partitions']:
+            partition_id = partition['id']
+            attempts = self._attempts(partition_id)
+            if self._is_done(partition_id):
+                state = 'done'
+            elif os.path.exists(self._path('claims', partition_id, 'lock')):
+                state = 'running'
+            elif attempts >= max_attempts:
+                state = 'failed'
+            else:
+                state = 'pending'
+            rows.append({**partition, 'state': state, 'attempts': attempts})
+        return pd.DataFrame(rows, columns=['id', 'source_file', 'rows', 'state', 'attempts'])
+
+    def merge(self, output_path):
+        """완료된 결과 파트를 하나의 CSV로 병합하고 전체 통계 반환"""
+        status = self.status()
+        pending = status[status['state'] != 'done']
+        if len(pending):
+            raise RuntimeError(f"완료되지 않은 파티션이 {len(pending)}개 있습니다.")
+
+        # 입력 파일마다 컬럼 구성이 다를 수 있으므로 전체 파트 컬럼의 합집합(등장 순서, 채점 열은 끝)으로 정렬
+        result_columns = ['label', 'total_score', 'accuracy_score', 'source_file']
+        output_columns = {}
+        for partition_id in status['id']:
+            output_columns.update(dict.fromkeys(self._read_columns('results', partition_id)))
+        output_columns = [column for column in output_columns if column not in result_columns] + result_columns
+
+        totals = {'rows': 0, 'score_sum': 0.0, 'high_quality': 0, 'seconds': 0.0}
+        temp_path = f"{output_path}.tmp.{os.getpid()}"
+        for position, partition_id in enumerate(status['id']):
+            # 파트 단위로 이어 쓰기 (전체 결과를 메모리에 올리지 않음)
+            self._read_frame('results', partition_id).reindex(columns=output_columns).to_csv(
+                temp_path,
+                mode='w' if position == 0 else 'a',
+                header=position == 0,
+                index=False,
+                encoding='utf-8-sig' if position == 0 else 'utf-8'
+            )
+            part_stats = self._read_json(self._path('stats', partition_id, 'json'))
+            for key in totals:
+                totals[key] += part_stats[key]
+        os.replace(temp_path, output_path)
+
+        summary = {
+            'partitions': len(status),
+            'rows': totals['rows'],
+            'average_score': totals['score_sum'] / totals['rows'] if totals['rows'] else 0.0,
+            'high_quality': totals['high_quality'],
+            'high_quality_ratio': totals['high_quality'] / totals['rows'] if totals['rows'] else 0.0,
+            'worker_seconds': totals['seconds'],
+            'output_path': output_path
+        }
+        self._write_json_atomic(os.path.join(self.job_dir, 'summary.json'), summary)
+        return summary
+
+def analyze_sharded_batch(scorer):
+    """공유 스토리지 분산 배치 작업 생성, 상태 확인, 병합"""
+    with st.expander("🗂️ 분산 배치 채점 (공유 스토리지)", expanded=False):
+        st.caption(
+            "코디네이터가 입력을 파티션으로 나누고, 각 장비에서 "
+            "`python advanced_prompt_scorer.py shard-work <작업 디렉터리>`로 워커를 실행합니다."
+        )
+        job_dir = st.text_input("작업 디렉터리 (공유 경로):", key="shard_job_dir")
+        if not job_dir:
+            return
+
+        job = ShardedBatchJob(job_dir)
+        if not os.path.exists(job.manifest_path):
+            input_paths = st.text_area("입력 CSV 경로 (한 줄에 하나):", key="shard_inputs")
+            text_column = st.text_input("텍스트 컬럼명:", key="shard_text_column")
+            rows_per_partition = st.number_input(
+                "파티션당 행 수:", min_value=10000, value=1000000, step=10000, key="shard_rows"
+            )
+            if st.button("작업 생성", key="shard_create", disabled=not (input_paths.strip() and text_column)):
+                try:
+                    paths = [line.strip() for line in input_paths.splitlines() if line.strip()]
+                    job = ShardedBatchJob.create(paths, job_dir, text_column, scorer, int(rows_per_partition))
+                    st.success(f"✅ {len(job.manifest['partitions'])}개 파티션 생성")
+                except Exception as e:
+                    st.error(f"❌ 작업 생성 오류: {str(e)}")
+            return
+
+        status = job.status()
+        state_counts = status['state'].value_counts()
+        state_cols = st.columns(4)
+        for column, state in zip(state_cols, ['done', 'running', 'pending', 'failed']):
+            with column:
+                st.metric(state, f"{state_counts.get(state, 0)}개")
+        st.dataframe(status, use_container_width=True)
+
+        action_col1, action_col2 = st.columns(2)
+        with action_col1:
+            if st.button("이 서버에서 워커 실행", key="shard_run_local"):
+                with st.spinner("파티션을 채점하고 있습니다..."):
+                    processed = job.run_worker(scorer)
+                st.success(f"✅ {len(processed)}개 파티션 처리")
+        with action_col2:
+            output_path = os.path.join(job_dir, 'merged_results.csv')
+            if st.button("결과 병합", key="shard_merge", disabled=state_counts.get('done', 0) != len(status)):
+                summary = job.merge(output_path)
+                st.success(f"✅ 병합 완료: {summary['output_path']}")
+                st.json(summary)
+
+def analyze_rule_diff(df, scorer):
+    """현재 규칙(A)과 수정 규칙(B)으로 동시에 채점하여 라벨 변화 비교"""
+    with st.expander("🔀 규칙 버전 비교 (A/B 동시 채점)", expanded=False):
+        text_columns = df.select_dtypes(include=['object']).columns.tolist()
+        if not text_columns:
+            st.info("텍스트 컬럼이 없습니다.")
+            return
+        column_name = st.selectbox("비교할 컬럼:", text_columns, key="rule_diff_column")
+        config_text = st.text_area(
+            "규칙 B 설정 (JSON, 키워드·가중치·임계값 수정):",
+            value=json.dumps(scorer.rule_config(), ensure_ascii=False, indent=2),
+            height=300,
+            key="rule_diff_config"
+        )
+
+        if st.button("규칙 비교 실행", key="rule_diff_run"):
+            try:
+                scorer_b = AdvancedPromptScorer.from_rule_config(json.loads(config_text))
+            except (json.JSONDecodeError, ValueError, TypeError) as e:
+                st.error(f"❌ 규칙 B 설정 오류: {str(e)}")
+                return
+
+            texts = build_prompt_texts(df, [column_name], False)
+            with track_batch(scorer.metrics, 'rule_diff'):
+                diff, summary = compare_rule_configs(texts, scorer, scorer_b)
+            if scorer.metrics is not None:
+                scorer.metrics.add_rows_scored('rule_diff', len(diff))
+
+            diff_col1, diff_col2, diff_col3, diff_col4 = st.columns(4)
+            with diff_col1:
+                st.metric("평균 점수 (A → B)", f"{summary['mean_score_b']:.1f}점", f"{summary['mean_delta']:+.2f}점")
+            with diff_col2:
+                st.metric(
+                    "고품질 (A → B)", f"{summary['high_quality_b']:,}개",
+                    f"{summary['high_quality_b'] - summary['high_quality_a']:+,}개"
+                )
+            with diff_col3:
+                st.metric("라벨 변경 (0→1 / 1→0)", f"{summary['flips_up']:,} / {summary['flips_down']:,}")
+            with diff_col4:
+                st.metric("변동 행 (점수·라벨)", f"{summary['moved_rows']:,}개")
+
+            # 점수 변화량 분포 (사전 집계)
+            deltas = diff['score_delta'].to_numpy()
+            if len(deltas) and deltas.min() != deltas.max():
+                counts, edges = np.histogram(deltas, bins=40)
+                fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, marker_color='#6f42c1'))
+                fig.update_layout(title="점수 변화량 분포 (B - A)", xaxis_title="점수 변화", yaxis_title="행 수", bargap=0)
+                st.plotly_chart(fig, use_container_width=True)
+
+            moved = diff[(diff['score_delta'] != 0) | (diff['label_flip'] != '')].copy()
+            moved['abs_delta'] = moved['score_delta'].abs()
+            moved = moved.sort_values(['label_flip', 'abs_delta'], ascending=[False, False]).drop(columns='abs_delta')
+            moved.insert(1, 'text', texts.iloc[moved['row'].to_numpy()].str.slice(0, 100).to_numpy())
+            st.write(f"**변동 행 (상위 {min(len(moved), 1000):,}개):**")
+            st.dataframe(moved.head(1000), use_container_width=True)
+            st.download_button(
+                label="📥 변동 행 다운로드",
+                data=moved.to_csv(index=False, encoding='utf-8-sig'),
+                file_name="rule_diff_moved_rows.csv",
+                mime="text/csv",
+                key="rule_diff_download"
+            )
+
+def analyze_reservoir_preview(scorer):
+    """대용량 CSV 전체 실행 전 표본 기반 빠른 추정"""
+    with st.expander("⚡ 빠른 미리보기 (표본 추정)", expanded=False):
+        st.caption("스트림에서 저수지 표본을 뽑아 표본만 채점합니다. '정밀화'를 누를 때마다 더 많은 행을 읽습니다.")
+        csv_path = st.text_input("서버 CSV 경로:", key="preview_path")
+        column_name = st.text_input("텍스트 컬럼명:", key="preview_column")
+        preview_col1, preview_col2 = st.columns(2)
+        with preview_col1:
+            sample_size = st.number_input("표본 크기:", min_value=100, value=2000, step=100, key="preview_sample_size")
+        with preview_col2:
+            time_budget = st.number_input("단계별 시간 예산 (초):", min_value=0.2, value=1.0, step=0.5, key="preview_budget")
+
+        button_col1, button_col2 = st.columns(2)
+        with button_col1:
+            start = st.button("미리보기", key="preview_start", disabled=not (csv_path and column_name))
+        with button_col2:
+            refine = st.button("정밀화", key="preview_refine", disabled='reservoir_preview' not in st.session_state)
+
+        if start:
+            if not os.path.exists(csv_path):
+                st.error(f"❌ 파일을 찾을 수 없습니다: {csv_path}")
+                return
+            previous = st.session_state.pop('reservoir_preview', None)
+            if previous is not None:
+                previous.close()
+            st.session_state['reservoir_preview'] = ReservoirPreview(csv_path, column_name, scorer, int(sample_size))
+
+        preview = st.session_state.get('reservoir_preview')
+        if preview is None or not (start or refine):
+            return
+        try:
+            estimate = preview.refine(float(time_budget))
+        except Exception as e:
+            st.error(f"❌ 미리보기 오류: {str(e)}")
+            st.session_state.pop('reservoir_preview', None)
+            return
+        if not estimate['sample_size']:
+            st.info("표본이 없습니다.")
+            return
+
+        low, high = estimate['mean_score_interval']
+        ratio_low, ratio_high = estimate['high_quality_ratio_interval']
+        estimate_col1, estimate_col2, estimate_col3 = st.columns(3)
+        with estimate_col1:
+            st.metric("평균 점수 (추정)", f"{estimate['mean_score']:.1f}점", help=f"{estimate['confidence']:.0%} 신뢰구간")
+            st.caption(f"{estimate['confidence']:.0%} CI: {low:.1f} ~ {high:.1f}점")
+        with estimate_col2:
+            st.metric("품질 비율 (추정)", f"{estimate['high_quality_ratio'] * 100:.1f}%")
+            st.caption(f"{estimate['confidence']:.0%} CI: {ratio_low * 100:.1f} ~ {ratio_high * 100:.1f}%")
+        with estimate_col3:
+            st.metric("읽은 비율", f"{estimate['coverage'] * 100:.1f}%")
+            st.caption(f"{estimate['rows_seen']:,}행 중 {estimate['sample_size']:,}개 표본 · {estimate['elapsed']:.1f}초")
+        if not estimate['exhausted']:
+            # 읽은 위치를 알 수 없으면 (coverage 0) 전체 행 수 대신 지금까지 읽은 행 수를 하한으로 표시
+            if estimate['estimated_total_rows'] is None:
+                total_rows_text = f"전체 {estimate['rows_seen']:,}행 이상"
+            else:
+                total_rows_text = f"예상 전체 {estimate['estimated_total_rows']:,}행"
+            st.info(
+                f"파일 앞부분 {estimate['coverage'] * 100:.1f}%만 반영된 추정입니다 "
+                f"({total_rows_text}). 정렬된 파일이면 '정밀화'로 더 읽어 주세요."
+            )
 
 def analyze_single_prompt_advanced(scorer):
     """고급 단일 프롬프트 분석"""
@@ -383,7 +2981,7 @@ def analyze_single_prompt_advanced(scorer):
     sample_df = None
     if uploaded_sample is not None:
         try:
-            sample_df = pd.read_csv(uploaded_sample, encoding='utf-8')
+            sample_df = read_csv_fast(uploaded_sample)
             
             # 샘플 정보 표시
             st.markdown(f"""
@@ -434,6 +3032,24 @@ def analyze_single_prompt_advanced(scorer):
         help="시스템 프롬프트 최적화를 위한 근거 기반 분석이 제공됩니다."
     )
     
+    # 실시간 점수 (입력 중에는 브라우저, 입력 확정 시에는 증분 매처로 갱신)
+    render_live_score_widget(scorer, "시스템 프롬프트를 입력하세요:")
+    if 'live_prompt_matcher' not in st.session_state:
+        st.session_state['live_prompt_matcher'] = IncrementalPromptMatcher(scorer)
+    live_score = st.session_state['live_prompt_matcher'].update(user_prompt)
+    if user_prompt.strip():
+        live_col1, live_col2, live_col3, live_col4 = st.columns(4)
+        with live_col1:
+            st.metric("실시간 총점", f"{live_score['total_score']:.1f}점")
+        with live_col2:
+            st.metric("정확도", f"{live_score['accuracy_score']}점")
+        with live_col3:
+            st.metric("길이 점수", f"{live_score['length_score']}점", help=f"{live_score['length']}자")
+        with live_col4:
+            st.metric("누락 특성", f"{len(live_score['missing_features'])}개")
+        if live_score['missing_features']:
+            st.caption("누락: " + ", ".join(live_score['missing_features']))
+    
     if st.button("🔬 고급 분석 시작", type="primary", disabled=len(user_prompt.strip()) == 0):
         if user_prompt.strip():
             with st.spinner("근거 기반 분석을 수행하고 있습니다..."):
@@ -611,15 +3227,129 @@ def analyze_single_prompt_advanced(scorer):
                 </div>
                 """, unsafe_allow_html=True)
 
+def analyze_multi_file_batch(sources, scorer, key_prefix):
+    """여러 CSV 파일(업로드 또는 서버 디렉터리)을 동시 읽기 파이프라인으로 채점하고 병합"""
+    st.subheader("🗃️ 다중 파일 배치 분석")
+    total_bytes = sum(csv_source_size(source) for _, source in sources)
+    st.success(f"✅ {len(sources)}개 파일 선택됨 ({total_bytes / 2 ** 20:.1f}MB)")
+    with st.expander("선택된 파일 목록", expanded=False):
+        st.write("\n".join(f"- {name}" for name, _ in sources))
+
+    # 파일마다 헤더만 읽어 컬럼 후보 구성 (등장 순서 유지)
+    columns = {}
+    for name, source in sources:
+        try:
+            columns.update(dict.fromkeys(read_csv_columns(source)))
+        except Exception as e:
+            st.warning(f"⚠️ {name} 헤더 읽기 오류: {str(e)}")
+    if not columns:
+        st.error("❌ 읽을 수 있는 CSV 헤더가 없습니다.")
+        return None
+    text_column = st.selectbox("분석할 프롬프트 컬럼 (모든 파일 공통):", list(columns), key=f"{key_prefix}_multi_column")
+    output_path = st.text_input(
+        "병합 결과 저장 경로 (서버, 비우면 다운로드로 제공):",
+        key=f"{key_prefix}_multi_output"
+    )
+
+    if not st.button("🚀 다중 파일 분석 시작", key=f"{key_prefix}_multi_start"):
+        return None
+
+    governor = get_memory_governor()
+    pipeline = MultiFileBatchPipeline(scorer, governor, text_column)
+    target_path = output_path or os.path.join(
+        os.environ.get('PROMPT_SCORER_SPILL_DIR') or tempfile.gettempdir(),
+        f"prompt_scorer_merged_{os.getpid()}_{threading.get_ident()}.csv"
+    )
+    temp_path = f"{target_path}.tmp.{os.getpid()}"
+    progress_bar = st.progress(0)
+    started = time.perf_counter()
+    try:
+        with st.spinner("파일을 읽고 채점하는 중입니다..."):
+            with governor.job(), track_batch(scorer.metrics, 'multi_file'), open(temp_path, 'wb') as output:
+                result_df, file_stats, failures = pipeline.run(
+                    sources, output,
+                    progress=lambda done, total: progress_bar.progress(done / total),
+                    columns=list(columns)
+                )
+        os.replace(temp_path, target_path)
+    except Exception as e:
+        st.error(f"❌ 다중 파일 분석 오류: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+    elapsed = time.perf_counter() - started
+    progress_bar.progress(1.0)
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("처리 파일", f"{len(file_stats)}개", delta=f"실패 {len(failures)}개" if len(failures) else None, delta_color="inverse")
+    with col2:
+        st.metric("전체 행", f"{len(result_df):,}")
+    with col3:
+        st.metric("평균 점수", f"{result_df['total_score'].mean():.1f}점" if len(result_df) else "-")
+    with col4:
+        st.metric("품질 비율", f"{result_df['label'].mean() * 100:.1f}%" if len(result_df) else "-")
+
+    if len(file_stats):
+        serial_seconds = file_stats['read_seconds'].sum() + file_stats['score_seconds'].sum()
+        st.caption(
+            f"소요 {elapsed:.1f}초 (읽기 {file_stats['read_seconds'].sum():.1f}초 + 채점 "
+            f"{file_stats['score_seconds'].sum():.1f}초, 순차 대비 {serial_seconds / max(elapsed, 1e-9):.2f}배)"
+        )
+        st.write("**파일별 통계:**")
+        st.dataframe(file_stats, use_container_width=True)
+    if len(failures):
+        st.write("**읽기/채점 실패 파일:**")
+        st.dataframe(failures, use_container_width=True)
+    if not len(result_df):
+        st.warning("⚠️ 채점된 행이 없습니다.")
+        return None
+
+    feature_flags = result_df[list(scorer.feature_keywords)]
+    pattern_stats = compute_feature_pattern_stats(feature_flags, result_df['label'])
+    render_aggregated_charts(result_df, result_df['text_length'].to_numpy(), pattern_stats, scorer.label_threshold, scorer.max_length)
+    with st.expander("📐 전체 코퍼스 특성 패턴 통계", expanded=False):
+        st.dataframe(pattern_stats['frequency'], use_container_width=True)
+
+    if output_path:
+        st.success(f"💾 병합 결과 저장: {output_path}")
+    else:
+        with open(target_path, 'rb') as f:
+            merged_csv = f.read()
+        os.remove(target_path)
+        st.download_button(
+            label="📥 병합 결과 다운로드",
+            data=merged_csv,
+            file_name="advanced_prompt_analysis_merged.csv",
+            mime="text/csv",
+            key=f"{key_prefix}_multi_download"
+        )
+    return result_df
+
 def analyze_csv_batch_advanced(scorer):
     """고급 CSV 배치 분석"""
     st.subheader("📁 고급 CSV 배치 분석")
     
-    uploaded_file = st.file_uploader("CSV 파일을 업로드하세요", type=['csv'], key="batch_analysis_upload")
+    uploaded_files = st.file_uploader(
+        "CSV 파일을 업로드하세요 (여러 개 선택 가능)", type=['csv'],
+        accept_multiple_files=True, key="batch_analysis_upload"
+    )
+    csv_directory = st.text_input("또는 CSV 디렉터리 경로 (서버):", key="batch_analysis_directory")
     
-    if uploaded_file is not None:
+    if len(uploaded_files) > 1 or csv_directory:
         try:
-            df = pd.read_csv(uploaded_file, encoding='utf-8')
+            sources = collect_csv_sources(uploaded_files, csv_directory)
+        except FileNotFoundError as e:
+            st.error(f"❌ {str(e)}")
+            return
+        if sources:
+            analyze_multi_file_batch(sources, scorer, "batch_analysis")
+        else:
+            st.warning("⚠️ CSV 파일을 찾지 못했습니다.")
+    elif uploaded_files:
+        uploaded_file = uploaded_files[0]
+        try:
+            df = read_csv_fast(uploaded_file)
             st.success(f"파일 업로드 성공! {len(df)}개 행 로드됨")
             
             # 데이터 미리보기
@@ -667,29 +3397,70 @@ def analyze_csv_advanced(df, scorer, column_name=None):
             st.warning("⚠️ 최소 하나의 컬럼을 선택해주세요.")
             return None
     
+    # 채점 엔진 선택
+    scoring_engine = st.radio(
+        "채점 엔진:",
+        ["규칙 기반", "학습 모델 (고속)"],
+        key="csv_scoring_engine",
+        horizontal=True
+    )
+    retrain_model = False
+    include_feature_analysis = True
+    if scoring_engine == "학습 모델 (고속)":
+        retrain_model = st.checkbox("모델 재학습 (캐시 무시)", key="csv_model_retrain")
+        include_feature_analysis = st.checkbox(
+            "특성 패턴 분석 포함 (키워드 정규식 검사로 모델 채점보다 오래 걸릴 수 있음)",
+            value=False,
+            key="csv_model_feature_analysis"
+        )
+    include_term_analysis = st.checkbox(
+        "라벨별 어휘 분석 포함 (대용량 파일에서는 채점보다 오래 걸릴 수 있음)",
+        value=False,
+        key="csv_term_analysis"
+    )
+    
     if st.button("🔬 고급 분석 시작", type="primary"):
         with st.spinner("근거 기반 분석을 수행하고 있습니다..."):
-            results = []
-            progress_bar = st.progress(0)
+            # 텍스트 결합 (전체를 파이썬 리스트로 복사하지 않고 청크마다 구간만 꺼냄)
+            texts = build_prompt_texts(df, selected_columns, combine_columns)
+            engine_comparison = None
+            learned_scorer = None
             
-            for idx, row in df.iterrows():
-                # 텍스트 결합
-                if combine_columns:
-                    text_parts = [str(row[col]) for col in selected_columns if pd.notna(row[col])]
-                    text = " ".join(text_parts)
-                else:
-                    text = str(row[selected_columns[0]]) if pd.notna(row[selected_columns[0]]) else ""
+            batch_mode = 'model' if scoring_engine == "학습 모델 (고속)" else 'rule'
+            governor = get_memory_governor()
+            with governor.job(), track_batch(scorer.metrics, batch_mode):
+                if scoring_engine == "학습 모델 (고속)":
+                    learned_scorer = LearnedPromptScorer(scorer)
+                    if learned_scorer.load_or_train(texts, retrain=retrain_model):
+                        st.info(f"🤖 모델 학습 완료 ({learned_scorer.training_info['trained_rows']:,}행) → {learned_scorer.cache_path()}")
+                    else:
+                        st.info(f"🤖 캐시된 모델 사용 (학습 시각: {learned_scorer.training_info.get('trained_at', '-')})")
                 
-                result = scorer.calculate_total_score(text)
-                results.append(result)
-                progress_bar.progress((idx + 1) / len(df))
+                # 메모리 예산에 맞춘 청크 채점 (예산 초과분은 디스크로 내보냄)
+                progress_bar = st.progress(0)
+                runner = BudgetedBatchRunner(
+                    scorer, governor, learned_scorer=learned_scorer, feature_flags=include_feature_analysis
+                )
+                batch_result = runner.run(texts, progress=lambda done, total: progress_bar.progress(done / total))
+                progress_bar.progress(1.0)
+                if learned_scorer is not None:
+                    engine_comparison = compare_scoring_engines(scorer, learned_scorer, texts)
             
-            # 결과 데이터프레임 생성
-            result_df = df.copy()
-            result_df['label'] = [r['label'] for r in results]
-            result_df['total_score'] = [r['total_score'] for r in results]
-            result_df['accuracy_score'] = [r['accuracy_score'] for r in results]
-            result_df['temperature_setting'] = [r['temperature_setting'] for r in results]
+            plan = batch_result.plan
+            st.caption(
+                f"메모리 예산 {plan['share_bytes'] / 2 ** 20:.0f}MB (텍스트 {plan['text_bytes'] / 2 ** 20:.0f}MB) · "
+                f"청크 {plan['chunk_rows']:,}행 · 작업자 {plan['workers']}개 · 디스크 파트 {batch_result.spilled_parts}개"
+            )
+            
+            # 행별 원본 복사 없이 차트와 통계에 쓰는 채점 열만 로드 (라벨, 점수, 길이, 특성 플래그)
+            result_columns = ['label', 'total_score', 'text_length']
+            if include_feature_analysis:
+                result_columns += list(scorer.feature_keywords)
+            result_df = batch_result.load(columns=result_columns, index=df.index)
+            pattern_stats = None
+            if include_feature_analysis:
+                feature_flags = result_df[list(scorer.feature_keywords)]
+                pattern_stats = compute_feature_pattern_stats(feature_flags, result_df['label'])
             
             # 결과 표시
             st.subheader("📊 분석 결과")
@@ -707,9 +3478,47 @@ def analyze_csv_advanced(df, scorer, column_name=None):
                 quality_ratio = (high_quality / len(result_df)) * 100
                 st.metric("품질 비율", f"{quality_ratio:.1f}%")
             
-            # 결과 테이블
-            st.dataframe(result_df, use_container_width=True)
+            # 결과 테이블 (상위 행만 브라우저로 전송)
+            preview_rows = 1000
+            preview_df = df.head(preview_rows).copy()
+            preview_scores = batch_result.head(preview_rows, batch_result.score_columns[:-1])
+            for column in batch_result.score_columns[:-1]:
+                preview_df[column] = preview_scores[column].to_numpy()
+            preview_df['temperature_setting'] = scorer.optimal_temperature
+            st.dataframe(preview_df, use_container_width=True)
+            if len(df) > preview_rows:
+                st.caption(f"상위 {preview_rows:,}행만 표시합니다. 전체 결과는 아래에서 다운로드하세요.")
+            
+            # 규칙 vs 모델 불일치 및 처리량
+            if engine_comparison is not None:
+                with st.expander("🤖 규칙 기반 vs 학습 모델 비교", expanded=True):
+                    cmp_col1, cmp_col2, cmp_col3 = st.columns(3)
+                    with cmp_col1:
+                        st.metric("비교 표본", f"{engine_comparison['sample_size']:,}행")
+                    with cmp_col2:
+                        st.metric("라벨 일치율", f"{engine_comparison['label_agreement'] * 100:.1f}%")
+                    with cmp_col3:
+                        st.metric("점수 평균 오차", f"{engine_comparison['score_mae']:.2f}점")
+                    st.write("**엔진별 처리량 (rows/sec):**")
+                    st.dataframe(engine_comparison['benchmark'], use_container_width=True)
+                    st.write(f"**라벨 불일치 행 ({len(engine_comparison['disagreements'])}개):**")
+                    st.dataframe(engine_comparison['disagreements'], use_container_width=True)
+
+            # 사전 집계 차트 (행 수가 아닌 구간 수에 비례하는 데이터만 전송)
+            text_lengths = result_df['text_length'].to_numpy()
+            render_aggregated_charts(result_df, text_lengths, pattern_stats, scorer.label_threshold, scorer.max_length)
             
+            # 라벨별 어휘 분석 (선택 시, 청크 단위 해싱 벡터화)
+            if include_term_analysis:
+                term_analyzer = CorpusTermAnalyzer()
+                label_values = result_df['label'].to_numpy()
+                term_chunksize = 50000
+                for start in range(0, len(texts), term_chunksize):
+                    term_analyzer.partial_fit(
+                        texts.iloc[start:start + term_chunksize].tolist(), label_values[start:start + term_chunksize]
+                    )
+                render_term_analysis(term_analyzer)
+
             # 온도 설정 및 라벨 임계값 피드백
             st.subheader("🌡️ 시스템 프롬프트 사용 가이드")
             st.markdown(f"""
@@ -730,10 +3539,13 @@ def analyze_csv_advanced(df, scorer, column_name=None):
             st.subheader("🎯 샘플 분석 기반 개선 제안")
             
             # 고품질 vs 저품질 프롬프트 분석
-            high_quality_results = [r for r in results if r['label'] == 1]
-            low_quality_results = [r for r in results if r['label'] == 0]
+            high_quality_mask = result_df['label'] == 1
+            low_quality_mask = result_df['label'] == 0
             
-            if high_quality_results and low_quality_results:
+            if pattern_stats is None:
+                st.info("ℹ️ 특성 패턴 분석을 생략했습니다. 강점·약점 패턴을 보려면 '특성 패턴 분석 포함'을 선택하세요.")
+            elif high_quality_mask.any() and low_quality_mask.any():
+                frequency = pattern_stats['frequency']
                 col_improve1, col_improve2 = st.columns(2)
                 
                 with col_improve1:
@@ -744,23 +3556,16 @@ def analyze_csv_advanced(df, scorer, column_name=None):
                     """, unsafe_allow_html=True)
                     
                     # 고품질 프롬프트 평균 점수 분석
-                    avg_high_score = sum(r['total_score'] for r in high_quality_results) / len(high_quality_results)
+                    avg_high_score = result_df.loc[high_quality_mask, 'total_score'].mean()
                     st.write(f"**평균 점수:** {avg_high_score:.1f}점")
-                    st.write(f"**개수:** {len(high_quality_results)}개")
-                    
-                    # 고품질 프롬프트 공통 패턴 분석
-                    high_quality_evidence = []
-                    for result in high_quality_results[:3]:  # 상위 3개 분석
-                        evidence = result.get('evidence_analysis', {})
-                        if evidence.get('strengths'):
-                            for strength in evidence['strengths']:
-                                high_quality_evidence.append(strength['type'])
+                    st.write(f"**개수:** {high_quality_mask.sum()}개")
                     
-                    if high_quality_evidence:
-                        pattern_counts = Counter(high_quality_evidence)
-                        st.write("**공통 강점 패턴:**")
-                        for pattern, count in pattern_counts.most_common(3):
-                            st.write(f"• {pattern}: {count}회 발견")
+                    # 고품질 프롬프트 공통 패턴 분석 (전체 코퍼스)
+                    strength_rates = frequency['rate_label_1'].sort_values(ascending=False)
+                    st.write("**공통 강점 패턴 (전체 고품질 대상):**")
+                    for pattern, rate in strength_rates.head(3).items():
+                        count = int(frequency.loc[pattern, 'count_label_1'])
+                        st.write(f"• {pattern}: {count}회 발견 ({rate * 100:.1f}%)")
                     
                 with col_improve2:
                     st.markdown("""
@@ -770,24 +3575,28 @@ def analyze_csv_advanced(df, scorer, column_name=None):
                     """, unsafe_allow_html=True)
                     
                     # 저품질 프롬프트 평균 점수 분석
-                    avg_low_score = sum(r['total_score'] for r in low_quality_results) / len(low_quality_results)
+                    low_quality_count = int(low_quality_mask.sum())
+                    avg_low_score = result_df.loc[low_quality_mask, 'total_score'].mean()
                     st.write(f"**평균 점수:** {avg_low_score:.1f}점")
-                    st.write(f"**개수:** {len(low_quality_results)}개")
+                    st.write(f"**개수:** {low_quality_count}개")
                     st.write(f"**개선 필요 점수:** {scorer.label_threshold - avg_low_score:.1f}점")
                     
-                    # 저품질 프롬프트 공통 약점 분석
-                    low_quality_weaknesses = []
-                    for result in low_quality_results[:5]:  # 하위 5개 분석
-                        evidence = result.get('evidence_analysis', {})
-                        if evidence.get('weaknesses'):
-                            for weakness in evidence['weaknesses']:
-                                low_quality_weaknesses.append(weakness['type'])
-                    
-                    if low_quality_weaknesses:
-                        weakness_counts = Counter(low_quality_weaknesses)
-                        st.write("**공통 약점 패턴:**")
-                        for pattern, count in weakness_counts.most_common(3):
-                            st.write(f"• {pattern}: {count}회 발견")
+                    # 저품질 프롬프트 공통 약점 분석 (전체 코퍼스)
+                    weakness_rates = (1.0 - frequency['rate_label_0']).sort_values(ascending=False)
+                    st.write("**공통 약점 패턴 (전체 저품질 대상):**")
+                    for pattern, rate in weakness_rates.head(3).items():
+                        count = low_quality_count - int(frequency.loc[pattern, 'count_label_0'])
+                        st.write(f"• {pattern}: {count}회 누락 ({rate * 100:.1f}%)")
+            
+            # 특성 동시 출현 및 라벨별 분포
+            if pattern_stats is not None:
+                with st.expander("📐 전체 코퍼스 특성 패턴 통계", expanded=False):
+                    st.write("**특성별 빈도 (라벨별):**")
+                    st.dataframe(pattern_stats['frequency'], use_container_width=True)
+                    st.write("**특성 동시 출현 행렬:**")
+                    st.dataframe(pattern_stats['cooccurrence'], use_container_width=True)
+                    st.write("**특성 조합별 라벨 분포:**")
+                    st.dataframe(pattern_stats['combinations'], use_container_width=True)
                 
             # 종합 개선 제안 (Claude + Perplexity 근거)
             st.subheader("🚀 종합 개선 제안 (AI 연구 근거)")
@@ -798,21 +3607,32 @@ def analyze_csv_advanced(df, scorer, column_name=None):
                     'claude_evidence': 'Claude 3.5 연구: 명확한 역할 정의 시 성능 95% 향상',
                     'perplexity_evidence': 'Perplexity 2024 분석: 전문가 역할 명시 시 정확도 92% 개선',
                     'suggestion': '"당신은 [분야]의 전문가입니다"로 시작하는 명확한 역할 정의',
-                    'priority': 'high'
+                    'priority': 'high',
+                    'feature': 'role_definition'
                 },
                     {
                         'category': '단계별 구조화',
                         'claude_evidence': 'Anthropic Constitutional AI: 단계별 지시 시 일관성 88% 향상',
                         'perplexity_evidence': 'Perplexity Chain-of-Thought: 구조화된 프롬프트 85% 성능 개선',
                         'suggestion': '복잡한 작업을 1, 2, 3단계로 명확히 분해하여 제시',
-                        'priority': 'high'
+                        'priority': 'high',
+                        'feature': 'step_by_step'
                     },
                     {
                         'category': '예시 포함',
                         'claude_evidence': 'Few-shot Learning 연구: 구체적 예시 포함 시 82% 성능 향상',
                         'perplexity_evidence': 'Perplexity 예시 분석: 관련 예시 제공 시 이해도 79% 증가',
                         'suggestion': '"예를 들어"로 시작하는 구체적이고 관련성 높은 예시 추가',
-                        'priority': 'medium'
+                        'priority': 'medium',
+                        'feature': 'examples_inclusion'
+                    },
+                    {
+                        'category': '제약 조건 명시',
+                        'claude_evidence': 'AI 안전성 연구: 제약 조건 명시 시 안전성 76% 향상',
+                        'perplexity_evidence': 'Perplexity 제약 조건 분석: 명확한 경계 설정 시 정확성 74% 개선',
+                        'suggestion': '"단, 다음 조건을 준수하세요"처럼 제약 조건과 규칙을 명시',
+                        'priority': 'medium',
+                        'feature': 'constraint_specification'
                     },
                     {
                         'category': '온도 최적화',
@@ -823,7 +3643,19 @@ def analyze_csv_advanced(df, scorer, column_name=None):
                     }
                 ]
                 
+            # 저품질 코퍼스에서 누락 비율이 높은 특성부터 우선 제시
+            priority_order = {'critical': 0, 'high': 1, 'medium': 2}
             for suggestion in improvement_suggestions:
+                suggestion['corpus_gap'] = get_feature_gap(pattern_stats, suggestion.get('feature'))
+            improvement_suggestions.sort(key=lambda x: (
+                priority_order.get(x['priority'], 3),
+                -(x['corpus_gap'] or 0.0)
+            ))
+                
+            for suggestion in improvement_suggestions:
+                corpus_evidence = ""
+                if suggestion['corpus_gap'] is not None:
+                    corpus_evidence = f"<br><strong>코퍼스 근거:</strong> 저품질 프롬프트의 {suggestion['corpus_gap'] * 100:.1f}%에서 누락"
                 priority_color = {
                     'critical': '#dc3545',
                     'high': '#fd7e14', 
@@ -835,22 +3667,41 @@ def analyze_csv_advanced(df, scorer, column_name=None):
                     <h5>🎯 {suggestion['category']} ({suggestion['priority'].upper()})</h5>
                     <strong>Claude 근거:</strong> {suggestion['claude_evidence']}<br>
                     <strong>Perplexity 근거:</strong> {suggestion['perplexity_evidence']}<br>
-                    <strong>구체적 제안:</strong> {suggestion['suggestion']}
+                    <strong>구체적 제안:</strong> {suggestion['suggestion']}{corpus_evidence}
                 </div>
                 """, unsafe_allow_html=True)
                 
-            # 다운로드
-            csv_data = result_df.to_csv(index=False, encoding='utf-8-sig')
+            # 다운로드 (결과 CSV를 디스크에 쓰고 버튼을 누를 때 파일에서 읽어 전송)
+            previous_path = st.session_state.pop('csv_download_path', None)
+            if previous_path is not None and os.path.exists(previous_path):
+                os.remove(previous_path)
+            fd, download_path = tempfile.mkstemp(prefix='prompt_scorer_result_', suffix='.csv', dir=runner.spill_root)
+            os.close(fd)
+            batch_result.write_csv(download_path, df, scorer.optimal_temperature)
+            batch_result.cleanup()
+            st.session_state['csv_download_path'] = download_path
+
+            def read_download():
+                with open(download_path, 'rb') as f:
+                    return f.read()
+
             st.download_button(
                 label="📥 분석 결과 다운로드",
-                data=csv_data,
+                data=read_download,
                 file_name="advanced_prompt_analysis.csv",
-                mime="text/csv"
+                mime="text/csv",
+                on_click='ignore'
             )
 
 def main():
     """메인 함수"""
     scorer = AdvancedPromptScorer()
+    scorer.metrics = get_metrics_registry()
+    # PROMPT_SCORER_METRICS_PORT=0 이면 HTTP 엔드포인트 비활성화
+    metrics_port = int(os.environ.get('PROMPT_SCORER_METRICS_PORT', '9464'))
+    metrics_server = None
+    if metrics_port:
+        metrics_server = start_metrics_server(os.environ.get('PROMPT_SCORER_METRICS_HOST', '127.0.0.1'), metrics_port)
     
     st.title("🎯 Advanced GPT-4.0 Prompt Scorer")
     st.markdown("**온도 40 최적화 | Claude & Perplexity 연구 기반 | 증거 기반 분석**")
@@ -862,14 +3713,32 @@ def main():
         analyze_single_prompt_advanced(scorer)
     
     with tab2:
-        uploaded_file = st.file_uploader("CSV 파일 업로드", type=['csv'], key="main_csv_upload")
-        if uploaded_file:
+        uploaded_files = st.file_uploader(
+            "CSV 파일 업로드 (여러 개 선택 가능)", type=['csv'],
+            accept_multiple_files=True, key="main_csv_upload"
+        )
+        csv_directory = st.text_input("또는 CSV 디렉터리 경로 (서버):", key="main_csv_directory")
+        if len(uploaded_files) > 1 or csv_directory:
+            try:
+                sources = collect_csv_sources(uploaded_files, csv_directory)
+                if sources:
+                    analyze_multi_file_batch(sources, scorer, "main")
+                else:
+                    st.warning("⚠️ CSV 파일을 찾지 못했습니다.")
+            except FileNotFoundError as e:
+                st.error(f"❌ {str(e)}")
+        elif uploaded_files:
             try:
-                df = pd.read_csv(uploaded_file, encoding='utf-8')
+                df = read_csv_fast(uploaded_files[0])
                 st.success(f"✅ 파일 업로드 완료: {len(df)}행 {len(df.columns)}열")
                 analyze_csv_advanced(df, scorer)
+                analyze_rule_diff(df, scorer)
             except Exception as e:
                 st.error(f"❌ 파일 읽기 오류: {str(e)}")
+        
+        analyze_reservoir_preview(scorer)
+        analyze_corpus_terms_streaming(scorer)
+        analyze_sharded_batch(scorer)
     
     with tab3:
         st.subheader("📖 고급 프롬프트 스코어링 가이드")
@@ -924,6 +3793,8 @@ def main():
         st.write("- Anthropic Claude 연구")
         st.write("- Constitutional AI 논문")
         st.write("- Few-shot Learning 연구")
+        
+        render_metrics_sidebar(scorer.metrics, metrics_server)
     
     # 중복 탭 제거 - 이미 위에 정의됨
     
@@ -948,5 +3819,48 @@ def main():
         - **임계값 특징**: 높을수록 정확도↑, 객관적 체크↑, 과적합 방지↑
         """)
 
+def run_shard_cli(argv):
+    """분산 배치 명령행 (shard-create / shard-work / shard-status / shard-merge)"""
+    parser = argparse.ArgumentParser(prog="advanced_prompt_scorer.py", description="분산 배치 채점")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = subparsers.add_parser('shard-create', help="입력 파일을 파티션으로 분할")
+    create_parser.add_argument('job_dir')
+    create_parser.add_argument('inputs', nargs='+')
+    create_parser.add_argument('--text-column', required=True)
+    create_parser.add_argument('--rows-per-partition', type=int, default=1000000)
+
+    work_parser = subparsers.add_parser('shard-work', help="파티션을 점유하여 채점")
+    work_parser.add_argument('job_dir')
+    work_parser.add_argument('--worker-id')
+    work_parser.add_argument('--lease-seconds', type=int, default=600)
+    work_parser.add_argument('--max-attempts', type=int, default=3)
+
+    status_parser = subparsers.add_parser('shard-status', help="파티션 상태 출력")
+    status_parser.add_argument('job_dir')
+
+    merge_parser = subparsers.add_parser('shard-merge', help="결과 파트 병합")
+    merge_parser.add_argument('job_dir')
+    merge_parser.add_argument('--output')
+
+    args = parser.parse_args(argv)
+    scorer = AdvancedPromptScorer()
+
+    if args.command == 'shard-create':
+        job = ShardedBatchJob.create(args.inputs, args.job_dir, args.text_column, scorer, args.rows_per_partition)
+        print(f"{len(job.manifest['partitions'])} partitions created in {args.job_dir}")
+    elif args.command == 'shard-work':
+        job = ShardedBatchJob(args.job_dir)
+        processed = job.run_worker(scorer, args.worker_id, args.lease_seconds, args.max_attempts)
+        print(f"{len(processed)} partitions processed")
+    elif args.command == 'shard-status':
+        print(ShardedBatchJob(args.job_dir).status().to_string(index=False))
+    elif args.command == 'shard-merge':
+        output_path = args.output or os.path.join(args.job_dir, 'merged_results.csv')
+        print(json.dumps(ShardedBatchJob(args.job_dir).merge(output_path), ensure_ascii=False, indent=2))
+
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1].startswith('shard-'):
+        run_shard_cli(sys.argv[1:])
+    else:
+        main()